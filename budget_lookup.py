@@ -12,12 +12,16 @@ Uses:
 
 import re
 import sys
+import warnings
+from functools import lru_cache
 from pathlib import Path
-from difflib import SequenceMatcher
-from typing import Optional, Tuple, Any
+from typing import Optional, Tuple, Any, NamedTuple
 
 import pandas as pd
 import numpy as np
+from rapidfuzz import process, fuzz
+
+from state_fips import STATE_FIPS as STATE_TO_CENSUS, STATE_FIPS_ANY_CASE
 
 # Try to import joblib/sklearn for model loading
 try:
@@ -27,28 +31,47 @@ except ImportError:
     HAS_ML = False
     print("Warning: joblib/scikit-learn not found. ML prediction disabled.")
 
+# Optional: pyarrow enables the Parquet sidecar cache for the budgets CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
 
 # Path modifications to find the neighboring project
 CURRENT_DIR = Path(__file__).parent
 BUDGET_PROJECT_DIR = CURRENT_DIR / "budget_registry"
 DATA_PATH = BUDGET_PROJECT_DIR / "data" / "processed" / "municipal_budgets.csv"
+PARQUET_PATH = DATA_PATH.with_suffix(".parquet")  # Pre-cleaned sidecar, rebuilt when the CSV or the cleaning changes
 MODEL_PATH = BUDGET_PROJECT_DIR / "models" / "budget_predictor_gbm.pkl"
 
+# sklearn warning for arrays passed to a model fit on a DataFrame (see _model_predict)
+_FEATURE_NAMES_WARNING = 'X does not have valid feature names'
+
+
+# Name normalization (shared by the column-wide load path and single-query path).
+# Suffixes are removed as literal substrings, in this order (" TOWN" also cuts into
+# " TOWNSHIP", keeping "X TOWNSHIP" distinct from "X CITY")
+# NOTE: Keeping COUNTY to ensure distinction between City/County of X
+_NAME_SUFFIXES = (' CITY', ' TOWN', ' VILLAGE', ' BOROUGH', ' TOWNSHIP', ' MUNICIPALITY')
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9\s]')
 
-# Census state code mapping
-STATE_TO_CENSUS = {
-    'AL': '01', 'AK': '02', 'AZ': '04', 'AR': '05', 'CA': '06',
-    'CO': '08', 'CT': '09', 'DE': '10', 'DC': '11', 'FL': '12',
-    'GA': '13', 'HI': '15', 'ID': '16', 'IL': '17', 'IN': '18',
-    'IA': '19', 'KS': '20', 'KY': '21', 'LA': '22', 'ME': '23',
-    'MD': '24', 'MA': '25', 'MI': '26', 'MN': '27', 'MS': '28',
-    'MO': '29', 'MT': '30', 'NE': '31', 'NV': '32', 'NH': '33',
-    'NJ': '34', 'NM': '35', 'NY': '36', 'NC': '37', 'ND': '38',
-    'OH': '39', 'OK': '40', 'OR': '41', 'PA': '42', 'RI': '44',
-    'SC': '45', 'SD': '46', 'TN': '47', 'TX': '48', 'UT': '49',
-    'VT': '50', 'VA': '51', 'WA': '53', 'WV': '54', 'WI': '55',
-    'WY': '56'
-}
+# Parquet sidecar metadata naming the cleaning that produced its Name_Clean column;
+# a sidecar written under any other key is rebuilt. Bump the version whenever
+# _clean_names or the derived columns change (the suffixes and pattern are part of the key).
+BUDGET_CACHE_VERSION = 2
+_CACHE_KEY_FIELD = b'budget_cache_key'
+_CACHE_KEY = f"{BUDGET_CACHE_VERSION}|{'|'.join(_NAME_SUFFIXES)}|{_NON_ALNUM_RE.pattern}".encode()
+
+
+class BudgetMatch(NamedTuple):
+    """Cached result of resolving a (city, state) pair to a verified budget row."""
+    total: float
+    db_pop: float
+    matched_name: str
+    match_type: str
 
 
 class MLPredictor:
@@ -69,24 +92,39 @@ class MLPredictor:
                 print(f"Failed to load ML model: {e}")
         else:
             print(f"ML model not found at {model_path}")
+        
+        # Repeated (lat, lon, population) queries are served from this cache
+        self._predict_cached = lru_cache(maxsize=4096)(self._predict_one)
             
     def predict(self, lat: float, lon: float, population: int) -> float:
         """Predict per-capita expenditure."""
         if not self.loaded or population <= 0:
             return 2000.0 # Fallback default
-            
+        
+        return self._predict_cached(round(float(lat), 4), round(float(lon), 4), float(population))
+    
+    def _predict_one(self, lat: float, lon: float, population: float) -> float:
         # Features: Latitude, Longitude, Log_Pop
-        log_pop = np.log1p(population)
-        X = pd.DataFrame([[lat, lon, log_pop]], columns=['Latitude', 'Longitude', 'Log_Pop'])
+        X = np.empty((1, 3), dtype=np.float32)
+        X[0, 0] = lat
+        X[0, 1] = lon
+        X[0, 2] = np.log1p(population)
         
         try:
             # Predict Log_Per_Capita
-            log_pc = self.model.predict(X)[0]
+            log_pc = self._model_predict(X)[0]
             pc = np.expm1(log_pc)
             return round(pc, 2)
         except Exception as e:
             print(f"Prediction error: {e}")
             return 2000.0
+    
+    def _model_predict(self, X: np.ndarray) -> np.ndarray:
+        """model.predict on a bare array, without sklearn's feature-name warning."""
+        # The model was fit on a DataFrame; the array columns are in the same order
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message=_FEATURE_NAMES_WARNING, category=UserWarning)
+            return self.model.predict(X)
 
 
 class BudgetEnricher:
@@ -98,9 +136,7 @@ class BudgetEnricher:
     def _load_data(self):
         if DATA_PATH.exists():
             try:
-                self.df = pd.read_csv(DATA_PATH)
-                self.df['Census_State'] = self.df['Census_State'].astype(str).str.zfill(2)
-                self.df['Name_Clean'] = self.df['Name'].apply(self._clean_name)
+                self.df = self._read_budgets()
             except Exception as e:
                 print(f"Error loading budget data: {e}")
                 self.df = pd.DataFrame()
@@ -108,9 +144,71 @@ class BudgetEnricher:
             print(f"Budget data not found at {DATA_PATH}")
             self.df = pd.DataFrame()
         
+        # Columnar copies of the fields enrich() reads, indexed by row position,
+        # so a match is a few array reads rather than a pandas Series build.
+        self.df = self.df.reset_index(drop=True)
+        self._total = np.empty(0)
+        self._pop = np.empty(0)
+        self._name = np.empty(0, dtype=object)
+        
+        # Lookup indexes built once so enrich() never scans the full DataFrame:
+        #   _exact:       (state, Name_Clean) -> row position (first occurrence wins)
+        #   _state_index: state -> (Name_Clean array, row positions) for fuzzy scoring
+        self._exact = {}
+        self._state_index = {}
+        if not self.df.empty:
+            # ~51 distinct states: categorical stores int8 codes plus one shared label per state
+            self.df['State'] = self.df['State'].astype('category')
+            
+            self._total = pd.to_numeric(self.df['Total_Expenditure'], errors='coerce').to_numpy(dtype=np.float64)
+            self._pop = pd.to_numeric(self.df['Population'], errors='coerce').to_numpy(dtype=np.float64)
+            self._name = self.df['Name'].to_numpy(dtype=object)
+            name_clean = self.df['Name_Clean'].to_numpy(dtype=object)
+            
+            first = self.df.drop_duplicates(['State', 'Name_Clean'])
+            self._exact = dict(zip(zip(first['State'], first['Name_Clean']), first.index))
+            for state, positions in self.df.groupby('State', sort=False, observed=True).indices.items():
+                self._state_index[state] = (name_clean[positions], positions)
+        
+        # Per-load memo of (city, state) -> BudgetMatch; rebuilt (invalidated) on every reload
+        self._resolve_row = lru_cache(maxsize=32768)(self._resolve_row_uncached)
+        
         # Load Predictor
         self.predictor = MLPredictor(MODEL_PATH)
             
+    def _read_budgets(self) -> pd.DataFrame:
+        """
+        Read the budgets table with Census_State and Name_Clean already computed.
+        
+        Prefers the Parquet sidecar (typed, columnar, no re-cleaning) when it is at
+        least as new as the CSV and was written by the current cleaning code;
+        otherwise parses the CSV and refreshes the sidecar.
+        """
+        if (HAS_PARQUET and PARQUET_PATH.exists()
+                and PARQUET_PATH.stat().st_mtime >= DATA_PATH.stat().st_mtime):
+            try:
+                # Only the footer is read to check the key
+                metadata = pq.read_schema(PARQUET_PATH).metadata or {}
+                if metadata.get(_CACHE_KEY_FIELD) == _CACHE_KEY:
+                    return pd.read_parquet(PARQUET_PATH)
+            except Exception as e:
+                print(f"Budget cache unreadable, rebuilding from CSV: {e}")
+        
+        df = pd.read_csv(DATA_PATH)
+        df['Census_State'] = df['Census_State'].astype(str).str.zfill(2)
+        df['Name_Clean'] = self._clean_names(df['Name'])
+        
+        if HAS_PARQUET:
+            try:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                table = table.replace_schema_metadata(
+                    {**(table.schema.metadata or {}), _CACHE_KEY_FIELD: _CACHE_KEY}
+                )
+                pq.write_table(table, PARQUET_PATH, compression='zstd')
+            except Exception as e:
+                print(f"Could not write budget cache: {e}")
+        return df
+    
     def _clean_name(self, name: Any) -> str:
         if pd.isna(name): return ""
         name = str(name).upper().strip()
@@ -119,16 +217,25 @@ class BudgetEnricher:
         name = name.replace("SAINT ", "ST ")
         
         # Remove common suffixes for cleaner matching
-        # NOTE: Keeping COUNTY to ensure distinction between City/County of X
-        for suffix in [' CITY', ' TOWN', ' VILLAGE', ' BOROUGH', ' TOWNSHIP', ' MUNICIPALITY']:
+        for suffix in _NAME_SUFFIXES:
             name = name.replace(suffix, '')
-        return re.sub(r'[^A-Z0-9\s]', '', name).strip()
+        return _NON_ALNUM_RE.sub('', name).strip()
+    
+    def _clean_names(self, names: pd.Series) -> pd.Series:
+        """Vectorized _clean_name over a whole column (pandas string kernels, no per-row Python)."""
+        s = names.fillna('').astype(str).str.upper().str.strip()
+        s = s.str.replace('SAINT ', 'ST ', regex=False)
+        for suffix in _NAME_SUFFIXES:
+            s = s.str.replace(suffix, '', regex=False)
+        return s.str.replace(_NON_ALNUM_RE, '', regex=True).str.strip()
     
     def _get_census_state(self, state: str) -> str:
+        # Fast path: pipeline input is almost always an exact 'TX'/'tx' key
+        code = STATE_FIPS_ANY_CASE.get(state)
+        if code is not None:
+            return code
         state = str(state).upper().strip()
-        if state in STATE_TO_CENSUS:
-            return STATE_TO_CENSUS[state]
-        return state.zfill(2)
+        return STATE_TO_CENSUS.get(state, state.zfill(2))
     
     def _find_match(self, city: str, census_state: str) -> Optional[Tuple[str, pd.Series]]:
         # NOTE: ignoring census_state code, using state string from input (converted to census_state in enrich? No.)
@@ -136,12 +243,42 @@ class BudgetEnricher:
         # We should use 'state' (abbrev) directly if available in self.df
         pass 
 
+    def _resolve_row_uncached(self, city: str, state: str) -> Optional[BudgetMatch]:
+        """Find the verified budget row for a normalized (city, state) pair, or None."""
+        # Filter by State Abbrev ("GOV_ID,Name,State,Census_State,...")
+        state_entry = self._state_index.get(state)
+        if state_entry is None:
+            return None
+            
+        names, positions = state_entry
+        city_clean = self._clean_name(city)
+        
+        i = self._exact.get((state, city_clean))
+        if i is not None:
+            match_type = 'exact'
+        else:
+            # Names are already normalized by _clean_name, so skip rapidfuzz's processor
+            hit = process.extractOne(city_clean, names, scorer=fuzz.ratio,
+                                     processor=None, score_cutoff=85)
+            if hit is None:
+                return None
+            _, best_score, pos = hit
+            i = positions[pos]
+            match_type = f'fuzzy ({best_score / 100:.0%})'
+        
+        return BudgetMatch(
+            total=float(self._total[i]),
+            db_pop=float(self._pop[i]),
+            matched_name=self._name[i],
+            match_type=match_type,
+        )
+
     def enrich(self, city, state, population=None, lat=None, lon=None):
         """
         Enrich with budget data.
         Returns dictionary with keys: total_expenditure, per_capita_expenditure, budget_source
         """
-        if not city:
+        if not city or not isinstance(city, str) or not isinstance(state, str):
             return {
                 "total_expenditure": None,
                 "per_capita_expenditure": None,
@@ -151,43 +288,19 @@ class BudgetEnricher:
         # Using State Abbreviation directly from DF
         if self.df.empty: return None
         
-        # Filter by State Abbrev (Column index 2 based on CSV? Or 'State' name)
-        # In init, we loaded DF. Check columns.
-        # "Code,Name,State,Census_State,..."
-        
-        state_df = self.df[self.df['State'] == state]
-        
-        if state_df.empty:
-             return {
-                "total_expenditure": None,
-                "per_capita_expenditure": None,
-                "budget_source": None
-            }
-            
-        city_clean = self._clean_name(city)
-        
-        exact = state_df[state_df['Name_Clean'] == city_clean]
-        match = None
-        if not exact.empty: 
-            match = ('exact', exact.iloc[0])
-        else:
-            best_score, best_row = 0.85, None
-            for _, row in state_df.iterrows():
-                score = SequenceMatcher(None, city_clean, row['Name_Clean']).ratio()
-                if score > best_score: best_score, best_row = score, row
-            if best_row is not None:
-                match = (f'fuzzy ({best_score:.0%})', best_row)
+        # Row resolution is the expensive part and is memoized; per-capita depends on
+        # the caller's population so it is computed fresh every time.
+        match = self._resolve_row(city.strip().upper(), state.strip().upper())
         
         if match:
-            match_type, row = match
-            total_exp = float(row['Total_Expenditure'])
+            total_exp = match.total
             
             # Calculate per capita if possible
             per_capita = None
             if population and population > 0:
                 per_capita = total_exp / population
-            elif row['Population'] and float(row['Population']) > 0:
-                 per_capita = total_exp / float(row['Population'])
+            elif match.db_pop > 0:
+                 per_capita = total_exp / match.db_pop
                  
             return {
                 "total_expenditure": total_exp,
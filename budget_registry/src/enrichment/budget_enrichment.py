@@ -7,25 +7,39 @@ Includes Machine Learning Predictor (Gradient Boosting) for unknown cities.
 import pandas as pd
 import numpy as np
 import re
+import warnings
 import joblib
+from functools import lru_cache
 from pathlib import Path
-from difflib import SequenceMatcher
+from rapidfuzz import process, fuzz
 
-# Census state code mapping
+# Census state code mapping (same table as the enrichment-flow state_fips module)
 STATE_TO_CENSUS = {
-    'AL': '10', 'AK': '02', 'AZ': '04', 'AR': '05', 'CA': '62',
-    'CO': '08', 'CT': '09', 'DE': '10', 'FL': '12', 'GA': '13',
-    'HI': '15', 'ID': '16', 'IL': '17', 'IN': '18', 'IA': '19',
-    'KS': '20', 'KY': '21', 'LA': '22', 'ME': '23', 'MD': '24',
-    'MA': '25', 'MI': '26', 'MN': '27', 'MS': '28', 'MO': '29',
-    'MT': '30', 'NE': '31', 'NV': '32', 'NH': '33', 'NJ': '34',
-    'NM': '35', 'NY': '36', 'NC': '37', 'ND': '38', 'OH': '39',
-    'OK': '40', 'OR': '41', 'PA': '42', 'RI': '44', 'SC': '45',
-    'SD': '46', 'TN': '47', 'TX': '48', 'UT': '49', 'VT': '50',
-    'VA': '51', 'WA': '53', 'WV': '54', 'WI': '55', 'WY': '56',
-    'DC': '11'
+    'AL': '01', 'AK': '02', 'AZ': '04', 'AR': '05', 'CA': '06',
+    'CO': '08', 'CT': '09', 'DE': '10', 'DC': '11', 'FL': '12',
+    'GA': '13', 'HI': '15', 'ID': '16', 'IL': '17', 'IN': '18',
+    'IA': '19', 'KS': '20', 'KY': '21', 'LA': '22', 'ME': '23',
+    'MD': '24', 'MA': '25', 'MI': '26', 'MN': '27', 'MS': '28',
+    'MO': '29', 'MT': '30', 'NE': '31', 'NV': '32', 'NH': '33',
+    'NJ': '34', 'NM': '35', 'NY': '36', 'NC': '37', 'ND': '38',
+    'OH': '39', 'OK': '40', 'OR': '41', 'PA': '42', 'RI': '44',
+    'SC': '45', 'SD': '46', 'TN': '47', 'TX': '48', 'UT': '49',
+    'VT': '50', 'VA': '51', 'WA': '53', 'WV': '54', 'WI': '55',
+    'WY': '56',
 }
 
+# Upper- and lowercase keys, so already-normalized input skips .upper().strip()
+STATE_FIPS_ANY_CASE = {**STATE_TO_CENSUS, **{k.lower(): v for k, v in STATE_TO_CENSUS.items()}}
+
+# Name normalization (shared by the column-wide load path and single-query path);
+# suffixes are removed as literal substrings, in this order
+_NAME_SUFFIXES = (' CITY', ' TOWN', ' VILLAGE', ' BOROUGH', ' TOWNSHIP')
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9\s]')
+
+
+# sklearn warning for arrays passed to a model fit on a DataFrame (see _model_predict)
+_FEATURE_NAMES_WARNING = 'X does not have valid feature names'
+
 class MLPredictor:
     """Gradient Boosting Predictor trained on 15,000 verified cities."""
     
@@ -36,19 +50,30 @@ class MLPredictor:
         else:
             self.model = None
             self.loaded = False
+        self._predict_cached = lru_cache(maxsize=4096)(self._predict_one)
             
     def predict(self, lat, lon, population):
         if not self.loaded or population <= 0:
             return 2000.0 # Fallback
-            
+        return self._predict_cached(round(float(lat), 4), round(float(lon), 4), float(population))
+    
+    def _predict_one(self, lat, lon, population):
         # Features: Latitude, Longitude, Log_Pop
-        log_pop = np.log1p(population)
-        X = pd.DataFrame([[lat, lon, log_pop]], columns=['Latitude', 'Longitude', 'Log_Pop'])
+        X = np.empty((1, 3), dtype=np.float32)
+        X[0, 0] = lat
+        X[0, 1] = lon
+        X[0, 2] = np.log1p(population)
         
         # Predict Log_Per_Capita
-        log_pc = self.model.predict(X)[0]
+        log_pc = self._model_predict(X)[0]
         pc = np.expm1(log_pc)
         return round(pc, 2)
+    
+    def _model_predict(self, X):
+        # Fit on a DataFrame, fed arrays in the same column order: silence the name warning
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message=_FEATURE_NAMES_WARNING, category=UserWarning)
+            return self.model.predict(X)
 
 class BudgetEnricher:
     """Enrich cities using verified Census budget data + ML predictions."""
@@ -64,10 +89,23 @@ class BudgetEnricher:
         if budget_path.exists():
             self.df = pd.read_csv(budget_path)
             self.df['Census_State'] = self.df['Census_State'].astype(str).str.zfill(2)
-            self.df['Name_Clean'] = self.df['Name'].apply(self._clean_name)
+            self.df['Name_Clean'] = self._clean_names(self.df['Name'])
         else:
             self.df = pd.DataFrame()
         
+        # (Census state, Name_Clean) -> row position for exact hits;
+        # Census state -> (Name_Clean array, rows) for fuzzy scoring
+        self._exact = {}
+        self._state_index = {}
+        if not self.df.empty:
+            # Few distinct state codes: keep them as a categorical (small int codes)
+            self.df['Census_State'] = self.df['Census_State'].astype('category')
+            first = self.df.drop_duplicates(['Census_State', 'Name_Clean'])
+            self._exact = dict(zip(zip(first['Census_State'], first['Name_Clean']), first.index))
+            for code, rows in self.df.groupby('Census_State', sort=False, observed=True):
+                rows = rows.reset_index(drop=True)
+                self._state_index[code] = (rows['Name_Clean'].to_numpy(), rows)
+        
         # Load Predictor
         model_path = base / "models" / "budget_predictor_gbm.pkl"
         self.predictor = MLPredictor(model_path)
@@ -75,31 +113,39 @@ class BudgetEnricher:
     def _clean_name(self, name):
         if pd.isna(name): return ""
         name = str(name).upper().strip()
-        for suffix in [' CITY', ' TOWN', ' VILLAGE', ' BOROUGH', ' TOWNSHIP']:
+        for suffix in _NAME_SUFFIXES:
             name = name.replace(suffix, '')
-        return re.sub(r'[^A-Z0-9\s]', '', name).strip()
+        return _NON_ALNUM_RE.sub('', name).strip()
+    
+    def _clean_names(self, names):
+        s = names.fillna('').astype(str).str.upper().str.strip()
+        for suffix in _NAME_SUFFIXES:
+            s = s.str.replace(suffix, '', regex=False)
+        return s.str.replace(_NON_ALNUM_RE, '', regex=True).str.strip()
     
     def _get_census_state(self, state):
+        # Fast path: pipeline input is almost always an exact 'TX'/'tx' key
+        code = STATE_FIPS_ANY_CASE.get(state)
+        if code is not None:
+            return code
         state = str(state).upper().strip()
-        if state in STATE_TO_CENSUS:
-            return STATE_TO_CENSUS[state]
-        return state.zfill(2)
+        return STATE_TO_CENSUS.get(state, state.zfill(2))
     
     def _find_match(self, city, census_state):
         if self.df.empty: return None
         city_clean = self._clean_name(city)
-        state_df = self.df[self.df['Census_State'] == census_state]
-        if state_df.empty: return None
+        idx = self._exact.get((census_state, city_clean))
+        if idx is not None: return ('exact', self.df.iloc[idx])
         
-        exact = state_df[state_df['Name_Clean'] == city_clean]
-        if not exact.empty: return ('exact', exact.iloc[0])
+        state_entry = self._state_index.get(census_state)
+        if state_entry is None: return None
+        names, state_df = state_entry
         
-        best_score, best_row = 0.85, None
-        for _, row in state_df.iterrows():
-            score = SequenceMatcher(None, city_clean, row['Name_Clean']).ratio()
-            if score > best_score: best_score, best_row = score, row
-            
-        if best_row is not None: return (f'fuzzy ({best_score:.0%})', best_row)
+        hit = process.extractOne(city_clean, names, scorer=fuzz.ratio,
+                                 processor=None, score_cutoff=85)
+        if hit is not None:
+            _, best_score, pos = hit
+            return (f'fuzzy ({best_score / 100:.0%})', state_df.iloc[pos])
         return None
     
     def enrich(self, city, state, population=None, lat=None, lon=None):
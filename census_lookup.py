@@ -10,52 +10,89 @@ Caches results to minimize API calls.
 import json
 import os
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
+import pandas as pd
 import requests
+from rapidfuzz import fuzz, process
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Optional: rapidfuzz for better fuzzy matching, falls back to simple ratio
-try:
-    from rapidfuzz import fuzz
-    HAS_RAPIDFUZZ = True
-except ImportError:
-    HAS_RAPIDFUZZ = False
-    print("Warning: rapidfuzz not installed. Using basic string matching.")
-    print("Install with: pip install rapidfuzz")
-
-
-# State FIPS codes for Census API
-STATE_FIPS = {
-    "AL": "01", "AK": "02", "AZ": "04", "AR": "05", "CA": "06",
-    "CO": "08", "CT": "09", "DE": "10", "DC": "11", "FL": "12", 
-    "GA": "13", "HI": "15", "ID": "16", "IL": "17", "IN": "18", 
-    "IA": "19", "KS": "20", "KY": "21", "LA": "22", "ME": "23", 
-    "MD": "24", "MA": "25", "MI": "26", "MN": "27", "MS": "28", 
-    "MO": "29", "MT": "30", "NE": "31", "NV": "32", "NH": "33", 
-    "NJ": "34", "NM": "35", "NY": "36", "NC": "37", "ND": "38", 
-    "OH": "39", "OK": "40", "OR": "41", "PA": "42", "RI": "44", 
-    "SC": "45", "SD": "46", "TN": "47", "TX": "48", "UT": "49", 
-    "VT": "50", "VA": "51", "WA": "53", "WV": "54", "WI": "55", 
-    "WY": "56",
-}
+from state_fips import STATE_FIPS
+
+
+# Shared HTTP session: keep-alive connection pool to api.census.gov (one TLS handshake
+# per pooled connection, not per state) with retries on transient failures
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+))
+_SESSION.headers.update({"Accept-Encoding": "gzip, deflate"})
 
 # Cache directory
 CACHE_DIR = Path(__file__).parent / ".cache"
 CACHE_DB = CACHE_DIR / "census_cache.db"
 
+# One connection per thread, reused for the life of the process
+_local = threading.local()
+
+# Set once init_cache_db has created/migrated the schema in this process
+_SCHEMA_READY = False
+_schema_lock = threading.Lock()
+
+# In-process copy of each state's places, so SQLite is read at most once per state,
+# plus their lowercased names (same order) so matching never re-lowercases them
+_STATE_PLACES: dict[str, list[dict]] = {}
+_STATE_NAMES_LC: dict[str, list[str]] = {}
+
+
+def _remember_places(state_key: str, places: list[dict]):
+    """Keep a state's places and pre-normalized names in memory."""
+    _STATE_NAMES_LC[state_key] = [place["name"].lower() for place in places]
+    _STATE_PLACES[state_key] = places
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Get this thread's cache DB connection, opening it (WAL, autocommit) on first use."""
+    conn = getattr(_local, "conn", None)
+    # A forked worker process must not reuse its parent's SQLite connection
+    if conn is None or _local.pid != os.getpid():
+        CACHE_DIR.mkdir(exist_ok=True)
+        conn = sqlite3.connect(CACHE_DB, isolation_level=None, check_same_thread=False)
+        # WAL lets concurrent readers proceed alongside a single writer
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
 
 def init_cache_db():
-    """Initialize SQLite cache database."""
-    CACHE_DIR.mkdir(exist_ok=True)
-    conn = sqlite3.connect(CACHE_DB)
-    cursor = conn.cursor()
+    """Initialize SQLite cache database and apply schema migrations (once per process)."""
+    global _SCHEMA_READY
+    with _schema_lock:
+        if _SCHEMA_READY:
+            return
+        _init_schema(_get_conn().cursor())
+        _SCHEMA_READY = True
+
+
+def _init_schema(cursor: sqlite3.Cursor):
+    """Create cache tables and add columns missing from older cache files."""
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS census_places (
             state TEXT,
             name TEXT,
             population INTEGER,
+            median_income INTEGER,
             place_fips TEXT,
             PRIMARY KEY (state, name)
         )
@@ -66,63 +103,99 @@ def init_cache_db():
             loaded_at TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+    
+    # Check if median_income column exists (migration)
+    cursor.execute("PRAGMA table_info(census_places)")
+    cols = [info[1] for info in cursor.fetchall()]
+    if 'median_income' not in cols:
+        print("Migrating cache DB: adding median_income column to census_places...")
+        cursor.execute("ALTER TABLE census_places ADD COLUMN median_income INTEGER")
 
 
 def is_state_cached(state: str) -> bool:
     """Check if state data is already cached."""
-    if not CACHE_DB.exists():
-        return False
-    conn = sqlite3.connect(CACHE_DB)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM state_loaded WHERE state = ?", (state.upper(),))
-    result = cursor.fetchone()
-    conn.close()
-    return result is not None
+    # The DB file can exist before its tables do (another thread may have just opened it)
+    if not _SCHEMA_READY:
+        init_cache_db()
+    cursor = _get_conn().execute("SELECT 1 FROM state_loaded WHERE state = ?", (state.upper(),))
+    return cursor.fetchone() is not None
 
 
 def cache_state_places(state: str, places: list[dict]):
     """Cache Census places for a state."""
-    conn = sqlite3.connect(CACHE_DB)
-    cursor = conn.cursor()
+    if not _SCHEMA_READY:
+        init_cache_db()
     
-    # Check if median_income column exists (migration)
-    cursor.execute("PRAGMA table_info(census_places)")
-    cols = [info[1] for info in cursor.fetchall()]
-    if 'median_income' not in cols:
-        print("Migrating cache DB: adding median_income column to census_places...")
-        cursor.execute("ALTER TABLE census_places ADD COLUMN median_income INTEGER")
+    state = state.upper()
+    conn = _get_conn()
+    cursor = conn.cursor()
     
-    for place in places:
-        cursor.execute("""
+    # Single transaction, one executemany for the whole state.
+    # IMMEDIATE takes the write lock up front so concurrent prefetch writers queue on busy_timeout.
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.executemany("""
             INSERT OR REPLACE INTO census_places (state, name, population, median_income, place_fips)
             VALUES (?, ?, ?, ?, ?)
-        """, (state.upper(), place["name"], place["population"], place.get("median_income"), place["place_fips"]))
-    
-    cursor.execute("""
-        INSERT OR REPLACE INTO state_loaded (state, loaded_at)
-        VALUES (?, datetime('now'))
-    """, (state.upper(),))
-    
-    conn.commit()
-    conn.close()
+        """, ((state, p["name"], p["population"], p.get("median_income"), p["place_fips"]) for p in places))
+        
+        cursor.execute("""
+            INSERT OR REPLACE INTO state_loaded (state, loaded_at)
+            VALUES (?, datetime('now'))
+        """, (state,))
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    cursor.execute("COMMIT")
 
 
 def get_cached_places(state: str) -> list[dict]:
     """Get cached Census places for a state."""
-    if not CACHE_DB.exists():
-        return []
-    conn = sqlite3.connect(CACHE_DB)
-    cursor = conn.cursor()
-    cursor.execute("""
+    if not _SCHEMA_READY:
+        init_cache_db()
+    cursor = _get_conn().execute("""
         SELECT name, population, median_income, place_fips FROM census_places WHERE state = ?
     """, (state.upper(),))
     rows = cursor.fetchall()
-    conn.close()
     return [{"name": r[0], "population": r[1], "median_income": r[2], "place_fips": r[3]} for r in rows]
 
 
+# "Austin city, Texas" -> "Austin" (also town/village/CDP/borough/municipality)
+_PLACE_TYPE_SPLIT = r" (?:city|town|village|CDP|borough|municipality),"
+
+
+def parse_census_places(data: list[list]) -> list[dict]:
+    """
+    Parse a Census API place response (header row + data rows) into place dicts.
+    
+    Column-wise pandas string/numeric ops replace a per-row Python loop.
+    """
+    if len(data) < 2:
+        return []
+    df = pd.DataFrame(data[1:])
+    
+    # Clean name, then "Boise City" -> "Boise"
+    names = df[0].str.split(_PLACE_TYPE_SPLIT, n=1, regex=True).str[0]
+    names = names.str.removesuffix(" City")
+    
+    # Population may be missing for some CDPs
+    pops = pd.to_numeric(df[1], errors="coerce").fillna(0).astype("int64")
+    
+    # Median Household Income (Census uses negative sentinels for "not available")
+    incomes = pd.to_numeric(df[2], errors="coerce").astype("Int64")
+    incomes = incomes.astype(object).where((incomes > 0).fillna(False), None)
+    
+    # FIPS code is the last element
+    place_fips = df[df.columns[-1]] if df.shape[1] > 2 else ""
+    
+    return pd.DataFrame({
+        "name": names,
+        "population": pops,
+        "median_income": incomes,
+        "place_fips": place_fips,
+    }).to_dict("records")
+
+
 def fetch_census_places(state_abbrev: str) -> list[dict]:
     """
     Fetch all places in a state from Census Bureau API.
@@ -134,13 +207,21 @@ def fetch_census_places(state_abbrev: str) -> list[dict]:
     Returns:
         List of dicts with name, population, place_fips
     """
-    fips = STATE_FIPS.get(state_abbrev.upper())
+    state_key = state_abbrev.upper()
+    fips = STATE_FIPS.get(state_key)
     if not fips:
         return []
     
+    # In-memory hit: no SQL at all
+    places = _STATE_PLACES.get(state_key)
+    if places is not None:
+        return places
+    
     # Check cache first
     if is_state_cached(state_abbrev):
-        return get_cached_places(state_abbrev)
+        places = get_cached_places(state_abbrev)
+        _remember_places(state_key, places)
+        return places
     
     # Fetch from ACS 5-year estimates API (more stable than PEP)
     # B01003_001E = Total Population
@@ -148,82 +229,106 @@ def fetch_census_places(state_abbrev: str) -> list[dict]:
     url = f"https://api.census.gov/data/2022/acs/acs5?get=NAME,B01003_001E,B19013_001E&for=place:*&in=state:{fips}"
     
     try:
-        response = requests.get(url, timeout=30)
+        response = _SESSION.get(url, timeout=30)
         response.raise_for_status()
         data = response.json()
     except Exception as e:
         print(f"Census API error for {state_abbrev}: {e}")
         return []
     
-    places = []
-    for row in data[1:]:  # Skip header row
-        # Clean name: "Austin city, Texas" -> "Austin"
-        raw_name = row[0]
-        name = raw_name.split(" city,")[0].split(" town,")[0].split(" village,")[0]
-        name = name.split(" CDP,")[0]  # Census Designated Place
-        name = name.split(" borough,")[0]
-        name = name.split(" municipality,")[0]
-        
-        # Additional cleaning for "Boise City" -> "Boise"
-        if name.endswith(" City"):
-            name = name[:-5]
-        
-        # Parse population (may be None for some CDPs)
-        try:
-            pop = int(row[1]) if row[1] else 0
-        except (ValueError, TypeError):
-            pop = 0
-            
-        # Parse Median Household Income
-        try:
-            income = int(row[2]) if row[2] and int(row[2]) > 0 else None
-        except (ValueError, TypeError):
-            income = None
-        
-        # Get FIPS code (last element)
-        place_fips = row[-1] if len(row) > 2 else ""
-        
-        places.append({
-            "name": name,
-            "population": pop,
-            "median_income": income,
-            "place_fips": place_fips,
-        })
+    places = parse_census_places(data)
     
     # Cache for future use
-    init_cache_db()
     cache_state_places(state_abbrev, places)
+    _remember_places(state_key, places)
     
     return places
 
 
-def simple_ratio(s1: str, s2: str) -> int:
-    """Simple string similarity ratio (0-100) without rapidfuzz."""
-    s1, s2 = s1.lower(), s2.lower()
-    if s1 == s2:
-        return 100
+def prefetch_states(states, max_workers: int = 16):
+    """
+    Warm the in-memory/SQLite place cache for several states concurrently.
     
-    # Levenshtein-ish: count matching chars
-    shorter, longer = (s1, s2) if len(s1) <= len(s2) else (s2, s1)
-    if len(longer) == 0:
-        return 100
+    Census API calls are I/O-bound, so fanning them out over threads makes the
+    warmup cost roughly the slowest single state instead of the sum of all states.
     
-    matches = sum(1 for c in shorter if c in longer)
-    return int((matches / len(longer)) * 100)
+    Args:
+        states: Iterable of two-letter state abbreviations (unknown values are ignored)
+        max_workers: Maximum concurrent API requests
+    """
+    pending = sorted({
+        s.strip().upper() for s in states
+        if isinstance(s, str) and s.strip().upper() in STATE_FIPS
+    } - _STATE_PLACES.keys())
+    if not pending:
+        return
+    
+    # Create the schema once before the threads start reading it
+    init_cache_db()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+        list(executor.map(fetch_census_places, pending))
 
 
-def match_score(city: str, place_name: str) -> int:
-    """Calculate match score between city and census place name."""
-    if HAS_RAPIDFUZZ:
-        return fuzz.ratio(city.lower(), place_name.lower())
-    else:
-        return simple_ratio(city, place_name)
+def match_score(city: str, place_name: str) -> float:
+    """Calculate match score (0-100) between city and census place name."""
+    return fuzz.ratio(city.lower(), place_name.lower())
+
+
+# Field order of the cached match tuple (see _match_place)
+_RESULT_KEYS = (
+    "census_population",
+    "census_median_income",
+    "census_place_fips",
+    "census_match_confidence",
+    "census_matched_name",
+)
+_NO_MATCH = (None, None, None, 0, None)
+
+
+@lru_cache(maxsize=65536)
+def _match_place(city_norm: str, state_norm: str) -> tuple:
+    """
+    Best Census place match for a normalized (city, state) key.
+    
+    Returns an immutable tuple in _RESULT_KEYS order so lru_cache never hands out
+    a shared mutable dict. Only called once the state's places are in memory.
+    """
+    places = _STATE_PLACES[state_norm]
+    
+    best_match = None
+    best_score = 0
+    
+    # Score every place in one C++ call against the pre-lowercased names.
+    # No score_cutoff: the best sub-threshold candidate is still reported below.
+    hit = process.extractOne(city_norm, _STATE_NAMES_LC[state_norm], scorer=fuzz.ratio, processor=None)
+    if hit is not None and hit[1] > 0:
+        best_score, best_match = hit[1], places[hit[2]]
+    
+    # Require at least 75% match confidence
+    if best_score >= 75 and best_match:
+        return (
+            best_match["population"],
+            best_match.get("median_income"),
+            best_match["place_fips"],
+            best_score,
+            best_match["name"],
+        )
+    
+    return (
+        None,
+        None,
+        best_match["place_fips"] if best_match else None,
+        best_score,
+        best_match["name"] if best_match else None,
+    )
 
 
 def lookup_population(city: str, state: str) -> dict:
     """
     Look up population for a city/place from Census data.
     
+    Repeated (city, state) pairs are answered from an in-process cache.
+    
     Args:
         city: City name to look up
         state: Two-letter state abbreviation
@@ -235,51 +340,16 @@ def lookup_population(city: str, state: str) -> dict:
             - census_match_confidence: Match score (0-100)
             - census_matched_name: Actual matched place name
     """
-    if not city or not state or not isinstance(state, str):
-        return {
-            "census_population": None,
-            "census_median_income": None,
-            "census_place_fips": None,
-            "census_match_confidence": 0,
-            "census_matched_name": None,
-        }
-    
-    places = fetch_census_places(state)
-    if not places:
-        return {
-            "census_population": None,
-            "census_median_income": None,
-            "census_place_fips": None,
-            "census_match_confidence": 0,
-            "census_matched_name": None,
-        }
+    if not city or not state or not isinstance(city, str) or not isinstance(state, str):
+        return dict(zip(_RESULT_KEYS, _NO_MATCH))
     
-    best_match = None
-    best_score = 0
+    state_norm = state.strip().upper()
     
-    for place in places:
-        score = match_score(city, place["name"])
-        if score > best_score:
-            best_score = score
-            best_match = place
+    # Not memoized on failure: a state whose fetch failed is retried on the next call
+    if not fetch_census_places(state_norm):
+        return dict(zip(_RESULT_KEYS, _NO_MATCH))
     
-    # Require at least 75% match confidence
-    if best_score >= 75 and best_match:
-        return {
-            "census_population": best_match["population"],
-            "census_median_income": best_match.get("median_income"),
-            "census_place_fips": best_match["place_fips"],
-            "census_match_confidence": best_score,
-            "census_matched_name": best_match["name"],
-        }
-    
-    return {
-        "census_population": None,
-        "census_median_income": None,
-        "census_place_fips": best_match["place_fips"] if best_match else None,
-        "census_match_confidence": best_score,
-        "census_matched_name": best_match["name"] if best_match else None,
-    }
+    return dict(zip(_RESULT_KEYS, _match_place(city.strip().lower(), state_norm)))
 
 
 # Quick test
@@ -27,6 +27,8 @@ BATCH_SIZE = 1                  # Save after EVERY row for crash recovery
 MAX_RETRIES = 5                 # Retry attempts per job
 RETRY_DELAY_SECONDS = 2         # Base delay for exponential backoff
 REQUEST_TIMEOUT_SECONDS = 180   # Increased timeout for reliability
+PROGRESS_SAVE_ROWS = 500        # Checkpoint the progress file every N completed rows...
+PROGRESS_SAVE_SECONDS = 30      # ...or every N seconds, whichever comes first
 
 # Standardized Job Families (19 options - LLM MUST choose from this list)
 JOB_FAMILIES = [
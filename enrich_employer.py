@@ -6,8 +6,13 @@ Rule-based employer type detection and canonical name extraction.
 Used for peer group filtering in compensation studies.
 """
 
+import bisect
+import math
 import re
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import pandas as pd
 
 
 # Patterns for detecting employer type from name
@@ -56,6 +61,105 @@ EMPLOYER_PATTERNS = [
     (r"^municipality\s+of\s+(.+)$", "City/Municipal Government"),
 ]
 
+# All patterns folded into one alternation so dispatch happens inside the regex engine.
+# Each pattern is wrapped in a named group g<i>; its own capture group follows it.
+# Unanchored patterns get a lazy ".*?" prefix so every alternative is tried at position 0:
+# the first alternative that matches is then the first pattern in EMPLOYER_PATTERNS order,
+# exactly as if the patterns were searched one by one.
+_COMBINED_RE = re.compile(
+    "|".join(
+        f"(?P<g{i}>{p if p.startswith('^') else '(?:.*?)' + p})"
+        for i, (p, _) in enumerate(EMPLOYER_PATTERNS)
+    ),
+    re.IGNORECASE,
+)
+_GROUP_TO_TYPE = [t for _, t in EMPLOYER_PATTERNS]
+_GROUP_TO_CAPTURE = [_COMBINED_RE.groupindex[f"g{i}"] + 1 for i in range(len(EMPLOYER_PATTERNS))]
+
+# Individually compiled patterns, used to extract the capture once the fast path picks one
+EMPLOYER_PATTERNS_COMPILED = [re.compile(p, re.IGNORECASE) for p, _ in EMPLOYER_PATTERNS]
+
+# Literal word anchors for the fast path: lowercase word tuples -> EMPLOYER_PATTERNS index.
+# A name is split into words once; its last 1-3 words and first 2 words are looked up
+# here, and the lowest matching index wins (same priority as the pattern list).
+_SUFFIX_ANCHORS = {
+    ("independent", "school", "district"): 0, ("isd",): 0,
+    ("unified", "school", "district"): 1, ("usd",): 1,
+    ("school", "district"): 2,
+    ("public", "schools"): 3,
+    ("community", "college"): 4,
+    ("college", "district"): 5,
+    ("state", "university"): 7,
+    ("water", "district"): 8, ("mwd",): 8, ("water", "authority"): 8,
+    ("utility", "district"): 9, ("mud",): 9, ("pud",): 9,
+    ("fire", "district"): 10, ("fire", "department"): 10,
+    ("sanitation", "district"): 11, ("sewer", "district"): 11,
+    ("transit", "authority"): 12, ("transit", "district"): 12, ("metro",): 12, ("mta",): 12,
+    ("transportation", "authority"): 13,
+    ("hospital", "district"): 14, ("health", "district"): 14, ("medical", "center"): 14,
+    ("housing", "authority"): 15,
+    ("county",): 17, ("county", "government"): 17,
+}
+_PREFIX_ANCHORS = {
+    ("county", "of"): 16,
+    ("state", "of"): 18,
+    ("city", "of"): 19,
+    ("town", "of"): 20,
+    ("village", "of"): 21,
+    ("borough", "of"): 22,
+    ("municipality", "of"): 23,
+}
+# "university of" is unanchored (can match mid-word), so its presence forces the full regex
+_UNIVERSITY_IDX = 6
+# Returned by _anchor_pattern_index when no pattern in EMPLOYER_PATTERNS can match
+_NO_PATTERN = -1
+
+# Keep the anchor tables honest if EMPLOYER_PATTERNS is edited
+assert all(EMPLOYER_PATTERNS_COMPILED[i].search("x " + " ".join(w)) for w, i in _SUFFIX_ANCHORS.items())
+assert all(EMPLOYER_PATTERNS_COMPILED[i].search(" ".join(w) + " x") for w, i in _PREFIX_ANCHORS.items())
+assert EMPLOYER_PATTERNS_COMPILED[_UNIVERSITY_IDX].search("university of x")
+
+
+def _anchor_pattern_index(employer_clean: str) -> Optional[int]:
+    """
+    Pick the winning EMPLOYER_PATTERNS index from literal anchors.
+    
+    Returns _NO_PATTERN when no anchor word is present (nothing can match),
+    or None if unsure and the full regex has to decide.
+    """
+    # IGNORECASE folds a few non-ASCII letters (e.g. "ſ" matches "s") that lower() keeps
+    if not employer_clean.isascii():
+        return None
+    lower = employer_clean.lower()
+    words = lower.split()
+    n = len(words)
+    best = None
+    for k in (1, 2, 3):
+        if n > k:
+            i = _SUFFIX_ANCHORS.get(tuple(words[-k:]))
+            if i is not None and (best is None or i < best):
+                best = i
+    if n > 2:
+        i = _PREFIX_ANCHORS.get((words[0], words[1]))
+        if i is not None and (best is None or i < best):
+            best = i
+    if "university" in lower and (best is None or best > _UNIVERSITY_IDX):
+        return None
+    return _NO_PATTERN if best is None else best
+
+# Canonical-name cleanup patterns
+_STATES_FULL = r"Alabama|Alaska|Arizona|Arkansas|California|Colorado|Connecticut|Delaware|Florida|Georgia|Hawaii|Idaho|Illinois|Indiana|Iowa|Kansas|Kentucky|Louisiana|Maine|Maryland|Massachusetts|Michigan|Minnesota|Mississippi|Missouri|Montana|Nebraska|Nevada|New Hampshire|New Jersey|New Mexico|New York|North Carolina|North Dakota|Ohio|Oklahoma|Oregon|Pennsylvania|Rhode Island|South Carolina|South Dakota|Tennessee|Texas|Utah|Vermont|Virginia|Washington|West Virginia|Wisconsin|Wyoming"
+_STATES_ABBREV = r"TX|CA|NY|FL|IL|PA|OH|GA|NC|MI|NJ|VA|WA|AZ|MA|TN|IN|MO|MD|WI|CO|MN|SC|AL|LA|KY|OR|OK|CT|UT|IA|NV|AR|MS|KS|NM|NE|ID|WV|HI|NH|ME|MT|RI|DE|SD|ND|AK|DC|VT|WY"
+# Trailing state noise, stripped in one pass. The pieces appear in text order
+# ", TX" + " Texas" + " (TX)", which is the same result as stripping the
+# parenthetical, then the full name, then the abbreviation one after another.
+_STATE_TAIL_RE = re.compile(
+    r"(?:,\s+(?:" + _STATES_ABBREV + r"))?"
+    r"(?:[,]?\s+(?:" + _STATES_FULL + r"))?"
+    r"(?:\s*\([A-Za-z\s\.]+\))?$",
+    re.IGNORECASE,
+)
+
 
 def classify_employer(employer: str) -> dict:
     """
@@ -69,41 +173,63 @@ def classify_employer(employer: str) -> dict:
             - employer_type_detected: Employer category
             - canonical_employer_name: Cleaned name for matching (e.g., "Austin")
     """
+    emp_type, canonical = _classify_employer_cached(employer)
+    return {
+        "employer_type_detected": emp_type,
+        "canonical_employer_name": canonical,
+    }
+
+
+@lru_cache(maxsize=50_000)
+def _classify_employer_cached(employer: str) -> Tuple[str, str]:
+    """Cached (employer_type_detected, canonical_employer_name) for a raw employer name."""
     if not employer:
-        return {
-            "employer_type_detected": "Unknown",
-            "canonical_employer_name": "",
-        }
+        return "Unknown", ""
     
     employer_clean = employer.strip()
+    if not employer_clean:
+        return "Unknown", ""
     
-    for pattern, emp_type in EMPLOYER_PATTERNS:
-        match = re.search(pattern, employer_clean, re.IGNORECASE)
+    # Fast path: literal word anchors pick the pattern; only that one regex runs.
+    # Names with no anchor word at all ("N/A", private companies) skip the regex entirely.
+    i = _anchor_pattern_index(employer_clean)
+    if i == _NO_PATTERN:
+        return "Unknown", employer_clean
+    match = EMPLOYER_PATTERNS_COMPILED[i].search(employer_clean) if i is not None else None
+    if match:
+        canonical = match.group(1)
+    else:
+        match = _COMBINED_RE.search(employer_clean)
         if match:
-            canonical = match.group(1).strip()
-            
-            # 1. Strip parenthetical states: "Aubrey (TX)" -> "Aubrey"
-            canonical = re.sub(r"\s*\([A-Za-z\s\.]+\)$", "", canonical)
-
-            # 2. Strip state name suffix: "Roanoke, Virginia" -> "Roanoke" or "Janesville Wisconsin" -> "Janesville"
-            # Matches ", State" or " State" where State is full definition
-            states_full = r"Alabama|Alaska|Arizona|Arkansas|California|Colorado|Connecticut|Delaware|Florida|Georgia|Hawaii|Idaho|Illinois|Indiana|Iowa|Kansas|Kentucky|Louisiana|Maine|Maryland|Massachusetts|Michigan|Minnesota|Mississippi|Missouri|Montana|Nebraska|Nevada|New Hampshire|New Jersey|New Mexico|New York|North Carolina|North Dakota|Ohio|Oklahoma|Oregon|Pennsylvania|Rhode Island|South Carolina|South Dakota|Tennessee|Texas|Utah|Vermont|Virginia|Washington|West Virginia|Wisconsin|Wyoming"
-            canonical = re.sub(r"[,]?\s+(" + states_full + r")$", "", canonical, flags=re.IGNORECASE)
-
-            # 3. Clean up state abbrevs: "Austin, TX" -> "Austin"
-            states_abbrev = r"TX|CA|NY|FL|IL|PA|OH|GA|NC|MI|NJ|VA|WA|AZ|MA|TN|IN|MO|MD|WI|CO|MN|SC|AL|LA|KY|OR|OK|CT|UT|IA|NV|AR|MS|KS|NM|NE|ID|WV|HI|NH|ME|MT|RI|DE|SD|ND|AK|DC|VT|WY"
-            canonical = re.sub(r",\s+(" + states_abbrev + r")$", "", canonical, flags=re.IGNORECASE)
-            
-            return {
-                "employer_type_detected": emp_type,
-                "canonical_employer_name": canonical.strip(),
-            }
+            i = int(match.lastgroup[1:])
+            canonical = match.group(_GROUP_TO_CAPTURE[i])
+    
+    if match:
+        emp_type = _GROUP_TO_TYPE[i]
+        canonical = canonical.strip()
+        
+        # Strip trailing state noise in one pass:
+        # parenthetical states: "Aubrey (TX)" -> "Aubrey"
+        # state name suffix: "Roanoke, Virginia" -> "Roanoke" or "Janesville Wisconsin" -> "Janesville"
+        # state abbrevs: "Austin, TX" -> "Austin"
+        canonical = _STATE_TAIL_RE.sub("", canonical)
+        
+        return emp_type, canonical.strip()
     
     # No pattern matched - return as-is with Unknown type
-    return {
-        "employer_type_detected": "Unknown",
-        "canonical_employer_name": employer_clean,
-    }
+    return "Unknown", employer_clean
+
+
+# Population band edges; a population equal to an edge falls in the band above it
+_POP_EDGES = (5000, 15000, 50000, 150000, 500000)
+_POP_BANDS = (
+    "Very Small (<5K)",
+    "Small (5K-15K)",
+    "Medium (15K-50K)",
+    "Large (50K-150K)",
+    "Very Large (150K-500K)",
+    "Major City (500K+)",
+)
 
 
 def get_population_band(population: Optional[int]) -> str:
@@ -118,18 +244,26 @@ def get_population_band(population: Optional[int]) -> str:
     """
     if population is None:
         return "Unknown"
-    if population < 5000:
-        return "Very Small (<5K)"
-    elif population < 15000:
-        return "Small (5K-15K)"
-    elif population < 50000:
-        return "Medium (15K-50K)"
-    elif population < 150000:
-        return "Large (50K-150K)"
-    elif population < 500000:
-        return "Very Large (150K-500K)"
-    else:
-        return "Major City (500K+)"
+    return _POP_BANDS[bisect.bisect_right(_POP_EDGES, population)]
+
+
+def get_population_bands(populations: pd.Series) -> pd.Series:
+    """
+    Vectorized get_population_band for a whole column of populations.
+    
+    Args:
+        populations: Census populations (None/NaN where unknown)
+    
+    Returns:
+        Series of population band strings
+    """
+    bands = pd.cut(
+        pd.to_numeric(populations, errors="coerce"),
+        bins=[-math.inf, *_POP_EDGES, math.inf],
+        labels=_POP_BANDS,
+        right=False,
+    )
+    return bands.astype(object).where(bands.notna(), "Unknown")
 
 
 def enrich_employer_data(employer: str, population: Optional[int] = None) -> dict:
@@ -143,9 +277,18 @@ def enrich_employer_data(employer: str, population: Optional[int] = None) -> dic
     Returns:
         dict with all employer metadata fields
     """
-    classification = classify_employer(employer)
-    classification["population_band"] = get_population_band(population)
-    return classification
+    emp_type, canonical, band = _enrich_employer_cached(employer, population)
+    return {
+        "employer_type_detected": emp_type,
+        "canonical_employer_name": canonical,
+        "population_band": band,
+    }
+
+
+@lru_cache(maxsize=50_000)
+def _enrich_employer_cached(employer: str, population: Optional[int]) -> Tuple[str, str, str]:
+    """Cached (type, canonical name, population band) for an (employer, population) pair."""
+    return _classify_employer_cached(employer) + (get_population_band(population),)
 
 
 # Quick test
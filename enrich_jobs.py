@@ -6,9 +6,10 @@ Enriches municipal job postings with structured compensation factors.
 Optimized for large-scale processing (tens of thousands of rows).
 
 Features:
-- 50+ parallel workers for high throughput
-- Streaming writes - each row saved immediately to CSV
-- Robust crash recovery - resume from exact row after any failure
+- 50+ concurrent API requests on a single asyncio event loop
+- Buffered streaming writes - rows are flushed to CSV at each progress checkpoint
+- Robust crash recovery - resume from the last checkpoint after any failure
+  (output written past it is truncated, so rows are never duplicated)
 - Progress tracking with ETA
 
 Usage:
@@ -18,25 +19,37 @@ Usage:
 """
 
 import argparse
+import asyncio
+import base64
 import csv
 import json
 import os
 import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from threading import Lock
 from datetime import datetime, timedelta, timezone
 
+import httpx
+import numpy as np
 import pandas as pd
-from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from tqdm import tqdm
 
-# Load environment variables from .env file
-load_dotenv()
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
+try:
+    import h2  # noqa: F401
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+# config loads environment variables from .env on import
 from config import (
     OPENROUTER_BASE_URL,
     MODEL_NAME,
@@ -45,14 +58,32 @@ from config import (
     MAX_RETRIES,
     RETRY_DELAY_SECONDS,
     REQUEST_TIMEOUT_SECONDS,
+    PROGRESS_SAVE_ROWS,
+    PROGRESS_SAVE_SECONDS,
     ENRICHMENT_COLUMNS,
 )
 from prompts import build_messages
 
-# Thread-safe locks
-write_lock = Lock()
+# Thread-safe lock for progress file writes
 progress_lock = Lock()
 
+# Input columns passed to the prompt; missing columns are sent as ""
+PROMPT_FIELDS = (
+    "job_title",
+    "employer",
+    "description",
+    "department",
+    "job_type",
+    "city",
+    "state",
+    "salary_min",
+    "salary_max",
+    "salary_type",
+)
+
+# Every enrichment column blank; flatten_enrichment copies this and fills in what the LLM returned
+_BLANK_ENRICHMENT = {col: "" for col in ENRICHMENT_COLUMNS}
+
 
 def get_api_key() -> str:
     """Get OpenRouter API key from environment."""
@@ -64,11 +95,22 @@ def get_api_key() -> str:
     return key
 
 
-def create_client(api_key: str) -> OpenAI:
-    """Create OpenRouter-compatible OpenAI client."""
-    return OpenAI(
+def create_client(api_key: str, workers: int = PARALLEL_WORKERS) -> AsyncOpenAI:
+    """
+    Create OpenRouter-compatible async OpenAI client.
+    
+    All requests share one connection pool; with h2 installed they are multiplexed
+    over a few HTTP/2 connections instead of one TLS socket per in-flight request.
+    """
+    http_client = httpx.AsyncClient(
+        http2=HAS_HTTP2,
+        limits=httpx.Limits(max_connections=workers * 2, max_keepalive_connections=workers * 2),
+        timeout=REQUEST_TIMEOUT_SECONDS,
+    )
+    return AsyncOpenAI(
         base_url=OPENROUTER_BASE_URL,
         api_key=api_key,
+        http_client=http_client,
         default_headers={
             "HTTP-Referer": "https://github.com/municipal-job-enrichment",
             "X-Title": "Municipal Job Enrichment Pipeline",
@@ -89,7 +131,8 @@ def parse_llm_response(content: str) -> dict:
         content = "\n".join(lines)
     
     try:
-        return json.loads(content)
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        return orjson.loads(content) if HAS_ORJSON else json.loads(content)
     except json.JSONDecodeError as e:
         return {"_parse_error": str(e), "_raw_content": content[:1000]}
 
@@ -100,8 +143,8 @@ def parse_llm_response(content: str) -> dict:
     retry=retry_if_exception_type((Exception,)),
     reraise=True,
 )
-def enrich_single_job(
-    client: OpenAI,
+async def enrich_single_job(
+    client: AsyncOpenAI,
     job_title: str,
     employer: str,
     description: str,
@@ -127,7 +170,7 @@ def enrich_single_job(
         salary_type=salary_type,
     )
     
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model=MODEL_NAME,
         messages=messages,
         temperature=0.1,
@@ -142,55 +185,69 @@ def enrich_single_job(
     return parse_llm_response(content)
 
 
-def process_single_row(client: OpenAI, row: dict, idx: int) -> tuple[int, dict, str | None]:
-    """Process a single row and return (index, enrichment_dict, error_message)."""
-    job_title = str(row.get("job_title", "") or "")
-    employer = str(row.get("employer", "") or "")
-    description = str(row.get("description", "") or "")
-    department = str(row.get("department", "") or "")
-    job_type = str(row.get("job_type", "") or "")
-    city = str(row.get("city", "") or "")
-    state = str(row.get("state", "") or "")
-    salary_min = str(row.get("salary_min", "") or "")
-    salary_max = str(row.get("salary_max", "") or "")
-    salary_type = str(row.get("salary_type", "") or "")
+# (epoch seconds, ISO string) of the last enriched_at timestamp
+_now_iso_cache = [0.0, ""]
+
+
+def _now_iso() -> str:
+    """UTC ISO timestamp for enriched_at, recomputed at most once per second."""
+    t = time.time()
+    if t - _now_iso_cache[0] >= 1.0:
+        _now_iso_cache[0] = t
+        _now_iso_cache[1] = datetime.fromtimestamp(t, timezone.utc).isoformat()
+    return _now_iso_cache[1]
+
+
+async def process_single_row(client: AsyncOpenAI, row: dict, idx: int) -> tuple[int, dict, str | None]:
+    """
+    Process a single row and return (index, enrichment_dict, error_message).
     
+    row holds the PROMPT_FIELDS already converted to strings (see build_prompt_inputs).
+    """
     try:
-        enrichment = enrich_single_job(
+        enrichment = await enrich_single_job(
             client=client,
-            job_title=job_title,
-            employer=employer,
-            description=description,
-            department=department,
-            job_type=job_type,
-            city=city,
-            state=state,
-            salary_min=salary_min,
-            salary_max=salary_max,
-            salary_type=salary_type,
+            job_title=row["job_title"],
+            employer=row["employer"],
+            description=row["description"],
+            department=row["department"],
+            job_type=row["job_type"],
+            city=row["city"],
+            state=row["state"],
+            salary_min=row["salary_min"],
+            salary_max=row["salary_max"],
+            salary_type=row["salary_type"],
         )
         
         if "_parse_error" in enrichment:
-            return (idx, {col: "" for col in ENRICHMENT_COLUMNS}, f"JSON parse error")
+            return (idx, _BLANK_ENRICHMENT.copy(), f"JSON parse error")
         
         # Add enriched_at timestamp (not from LLM)
-        enrichment['enriched_at'] = datetime.now(timezone.utc).isoformat()
+        enrichment['enriched_at'] = _now_iso()
         
         return (idx, enrichment, None)
         
     except Exception as e:
-        return (idx, {col: "" for col in ENRICHMENT_COLUMNS}, str(e)[:100])
+        return (idx, _BLANK_ENRICHMENT.copy(), str(e)[:100])
+
+
+def build_prompt_inputs(df: pd.DataFrame) -> list[dict]:
+    """Stringify the PROMPT_FIELDS columns in bulk, one dict per row (NaN becomes "")."""
+    fields = pd.DataFrame(
+        {col: df[col].fillna("").astype(str) if col in df.columns else "" for col in PROMPT_FIELDS},
+        index=df.index,
+    )
+    return fields.to_dict(orient="records")
 
 
 def flatten_enrichment(enrichment: dict) -> dict:
     """Flatten enrichment dict, converting lists to JSON strings."""
-    result = {}
-    for col in ENRICHMENT_COLUMNS:
-        value = enrichment.get(col)
+    result = _BLANK_ENRICHMENT.copy()
+    for col, value in enrichment.items():
+        if col not in _BLANK_ENRICHMENT or value is None:
+            continue
         if isinstance(value, list):
-            result[col] = json.dumps(value) if len(value) > 0 else ""
-        elif value is None:
-            result[col] = ""
+            result[col] = json.dumps(value) if value else ""
         else:
             result[col] = str(value)
     return result
@@ -201,25 +258,48 @@ def get_progress_file(output_path: Path) -> Path:
     return output_path.with_suffix(".progress.json")
 
 
-def load_progress(progress_file: Path) -> set:
-    """Load set of already-processed row indices."""
+def load_progress(progress_file: Path, total: int) -> tuple[np.ndarray, int | None]:
+    """
+    Load the processed-row bitmap (bool array of length total) and the output size
+    in bytes at the checkpoint that wrote it (None for older progress files).
+    
+    Progress files store the bitmap packed and base64-encoded under "processed_bitmap";
+    older files with a "processed_indices" list are still accepted.
+    """
+    processed = np.zeros(total, dtype=bool)
+    output_bytes = None
     if progress_file.exists():
-        with open(progress_file, 'r') as f:
-            data = json.load(f)
-            return set(data.get("processed_indices", []))
-    return set()
-
-
-def save_progress(progress_file: Path, processed_indices: set, total: int, errors: int):
-    """Save progress to file."""
+        with open(progress_file, 'rb') as f:
+            data = orjson.loads(f.read()) if HAS_ORJSON else json.load(f)
+        if "processed_bitmap" in data:
+            bits = np.unpackbits(np.frombuffer(base64.b64decode(data["processed_bitmap"]), dtype=np.uint8))
+            n = min(total, len(bits))
+            processed[:n] = bits[:n].astype(bool)
+        else:
+            indices = np.fromiter(data.get("processed_indices", []), dtype=np.int64)
+            processed[indices[indices < total]] = True
+        output_bytes = data.get("output_bytes")
+    return processed, output_bytes
+
+
+def save_progress(
+    progress_file: Path, processed: np.ndarray, total: int, errors: int, output_bytes: int
+):
+    """Save progress to file, with the output size the bitmap corresponds to."""
+    data = {
+        "processed_bitmap": base64.b64encode(np.packbits(processed).tobytes()).decode("ascii"),
+        "total": total,
+        "errors": errors,
+        "output_bytes": output_bytes,
+        "last_updated": datetime.now().isoformat(),
+    }
     with progress_lock:
-        with open(progress_file, 'w') as f:
-            json.dump({
-                "processed_indices": list(processed_indices),
-                "total": total,
-                "errors": errors,
-                "last_updated": datetime.now().isoformat(),
-            }, f)
+        if HAS_ORJSON:
+            with open(progress_file, 'wb') as f:
+                f.write(orjson.dumps(data))
+        else:
+            with open(progress_file, 'w') as f:
+                json.dump(data, f)
 
 
 def process_jobs(
@@ -249,20 +329,21 @@ def process_jobs(
     
     # Progress tracking
     progress_file = get_progress_file(output_path)
-    processed_indices = set()
+    processed = np.zeros(total_rows, dtype=bool)
+    output_bytes = None
     
     if resume and progress_file.exists():
-        processed_indices = load_progress(progress_file)
-        print(f"Resuming: {len(processed_indices)} rows already processed")
+        processed, output_bytes = load_progress(progress_file, total_rows)
+        print(f"Resuming: {int(processed.sum())} rows already processed")
     
     # Determine rows to process
-    rows_to_process = [i for i in range(total_rows) if i not in processed_indices]
+    rows_to_process = np.flatnonzero(~processed).tolist()
     
     if len(rows_to_process) == 0:
         print("All rows already processed!")
         return
     
-    print(f"\nProcessing {len(rows_to_process)} rows with {workers} parallel workers...")
+    print(f"\nProcessing {len(rows_to_process)} rows with {workers} concurrent requests...")
     print(f"Output: {output_path}")
     print(f"Progress file: {progress_file}")
     
@@ -272,69 +353,106 @@ def process_jobs(
         return
     
     api_key = get_api_key()
-    client = create_client(api_key)
+    
+    # Materialize rows once instead of building a Series per row with df.iloc;
+    # output rows keep the original values, prompt inputs are stringified in bulk
+    records = df.to_dict(orient="records")
+    prompt_inputs = build_prompt_inputs(df)
+    
+    # Open the output once for the whole run; rows are flushed before each progress save
+    # so the progress file never lists a row that is not on disk
+    new_output = not resume or not output_path.exists()
+    if not new_output and output_bytes is not None and output_path.stat().st_size > output_bytes:
+        # The buffer can fill and flush between checkpoints; drop rows the bitmap
+        # does not list (including a partly written last row) so they are not duplicated
+        print(f"Truncating {output_path} to its last checkpoint ({output_bytes} bytes)")
+        os.truncate(output_path, output_bytes)
+    out_fh = open(output_path, 'w' if new_output else 'a', newline='', encoding='utf-8', buffering=1 << 20)
+    writer = csv.writer(out_fh)
     
     # Initialize output file if new run
-    if not resume or not output_path.exists():
+    if new_output:
         # Write header with all columns
-        with open(output_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=output_columns)
-            writer.writeheader()
+        writer.writerow(output_columns)
         
         # Write already-processed rows if resuming from a different output
-        if processed_indices:
-            print(f"Writing {len(processed_indices)} previously processed rows...")
+        if processed.any():
+            print(f"Writing {int(processed.sum())} previously processed rows...")
     
     errors = []
     error_count = 0
     start_time = time.time()
+    last_save = start_time
+    since_save = 0
     
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        # Submit all jobs
-        futures = {}
-        for idx in rows_to_process:
-            row_dict = df.iloc[idx].to_dict()
-            future = executor.submit(process_single_row, client, row_dict, idx)
-            futures[future] = (idx, row_dict)
+    async def run_all() -> None:
+        """Fan out API calls (at most `workers` in flight) and write results as they complete."""
+        nonlocal error_count, last_save, since_save
         
-        # Process results as they complete - with streaming writes
-        with tqdm(total=len(rows_to_process), desc="Enriching") as pbar:
-            for future in as_completed(futures):
-                idx, original_row = futures[future]
-                result_idx, enrichment, error = future.result()
-                
-                # Merge original row with enrichment
-                flat = flatten_enrichment(enrichment)
-                output_row = {**original_row, **flat}
-                
-                # Stream write to CSV immediately (thread-safe)
-                with write_lock:
-                    with open(output_path, 'a', newline='', encoding='utf-8') as f:
-                        writer = csv.DictWriter(f, fieldnames=output_columns)
-                        writer.writerow(output_row)
-                    
-                    # Update progress
-                    processed_indices.add(idx)
-                
-                if error:
-                    errors.append({"idx": idx, "error": error})
-                    error_count += 1
-                
-                pbar.update(1)
-                
-                # Save progress frequently
-                if len(processed_indices) % 10 == 0:
-                    save_progress(progress_file, processed_indices, total_rows, error_count)
-                    
-                    # Update ETA
-                    elapsed = time.time() - start_time
-                    rate = pbar.n / elapsed if elapsed > 0 else 0
-                    remaining = len(rows_to_process) - pbar.n
-                    eta = remaining / rate if rate > 0 else 0
-                    pbar.set_postfix_str(f"ETA: {timedelta(seconds=int(eta))}")
+        async with create_client(api_key, workers) as client:
+            # Sliding window: a new row is started only when one finishes, so memory
+            # stays O(workers) instead of holding a task per row for the whole run
+            rows_iter = iter(rows_to_process)
+            pending = set()
+            
+            def start_next() -> None:
+                idx = next(rows_iter, None)
+                if idx is not None:
+                    pending.add(asyncio.create_task(process_single_row(client, prompt_inputs[idx], idx)))
+            
+            for _ in range(workers):
+                start_next()
+            
+            # Process results as they complete - with streaming writes.
+            # Everything below runs on the event loop thread, so no write lock is needed.
+            with tqdm(total=len(rows_to_process), desc="Enriching") as pbar:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        idx, enrichment, error = task.result()
+                        start_next()
+                        
+                        # Merge original row with enrichment
+                        flat = flatten_enrichment(enrichment)
+                        output_row = {**records[idx], **flat}
+                        
+                        # Stream write to CSV immediately (plain csv.writer: no per-row key validation)
+                        writer.writerow([output_row.get(c, "") for c in output_columns])
+                        
+                        # Update progress
+                        processed[idx] = True
+                        
+                        if error:
+                            errors.append({"idx": idx, "error": error})
+                            error_count += 1
+                        
+                        pbar.update(1)
+                        
+                        # Checkpoint progress every PROGRESS_SAVE_ROWS rows or PROGRESS_SAVE_SECONDS;
+                        # each save rewrites the whole bitmap, so there is no point doing it every row
+                        since_save += 1
+                        if since_save >= PROGRESS_SAVE_ROWS or time.time() - last_save >= PROGRESS_SAVE_SECONDS:
+                            out_fh.flush()
+                            save_progress(progress_file, processed, total_rows, error_count,
+                                          os.fstat(out_fh.fileno()).st_size)
+                            since_save = 0
+                            last_save = time.time()
+                        
+                        if pbar.n % 10 == 0:
+                            # Update ETA
+                            elapsed = time.time() - start_time
+                            rate = pbar.n / elapsed if elapsed > 0 else 0
+                            remaining = len(rows_to_process) - pbar.n
+                            eta = remaining / rate if rate > 0 else 0
+                            pbar.set_postfix_str(f"ETA: {timedelta(seconds=int(eta))}")
     
-    # Final progress save
-    save_progress(progress_file, processed_indices, total_rows, error_count)
+    try:
+        asyncio.run(run_all())
+    finally:
+        out_fh.close()
+        
+        # Final progress save (also on interrupt, so written rows are not redone on resume)
+        save_progress(progress_file, processed, total_rows, error_count, output_path.stat().st_size)
     
     # Summary
     elapsed = time.time() - start_time
@@ -17,24 +17,69 @@ Usage:
 import argparse
 import csv
 import json
+import multiprocessing
+import os
+from functools import lru_cache
+from itertools import chain, islice
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
-from enrich_employer import classify_employer, get_population_band
-from census_lookup import lookup_population
-from budget_lookup import lookup_budget
-from statistical_processing import process_statistical_enrichment
+from enrich_employer import classify_employer, get_population_band, get_population_bands
+from census_lookup import lookup_population, prefetch_states
+from budget_lookup import get_budget_enricher, lookup_budget
+from statistical_processing import (
+    STATS_INPUT_COLUMNS,
+    process_statistical_enrichment,
+    process_statistical_enrichment_batch,
+)
 
 
+# Input rows read, enriched and written per batch
+READ_CHUNKSIZE = 10_000
+
+# Rows handed to each worker process at a time (one statistical batch each)
+POOL_CHUNKSIZE = 1000
+
 # Column renaming map for final output
 OUTPUT_COLUMN_MAP = {
     "total_expenditure": "Total Expenditure",
     "per_capita_expenditure": "Per Capita Expenditure"
 }
 
+# Entries kept by each pipeline-level lookup cache (bounded so memory does not
+# grow with input size on large files)
+LOOKUP_CACHE_SIZE = 65536
+
+# Decimals coordinates are rounded to before keying the budget cache (~11 m)
+COORD_CACHE_DECIMALS = 4
+
+# Census columns that mix ints with floats or None (population/income are None without a
+# match, match confidence defaults to int 0 next to float scores); a whole-output DataFrame
+# parses them as float, so they are written as floats ("486669.0", "0.0") in every chunk
+FLOAT_OUTPUT_COLUMNS = ("census_population", "census_median_household_income", "census_match_confidence")
+
+# Employer types that get Census population and budget lookups
+LOOKUP_EMPLOYER_TYPES = frozenset({"City/Municipal Government", "County Government"})
+
+# Census/budget columns for rows without a lookup, applied in one dict update
+LOOKUP_DEFAULTS = {
+    "census_population": None,
+    "census_median_household_income": None,
+    "census_place_fips": None,
+    "census_match_confidence": 0,
+    "census_matched_name": None,
+    "population_band": "Unknown",
+    "total_expenditure": None,
+    "per_capita_expenditure": None,
+    "budget_source": None,
+    "employer_lat": None,
+    "employer_lon": None,
+}
+
 # New columns added by this pipeline
 METADATA_COLUMNS = [
     # Employer classification
@@ -71,48 +116,90 @@ METADATA_COLUMNS = [
 ]
 
 
-def process_row(row: dict) -> dict:
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def _lookup_population_cached(city: str, state: str) -> dict:
+    """lookup_population memoized on (city, state); many postings share a city."""
+    return lookup_population(city, state)
+
+
+def _lookup_budget_cached(
+    city: str,
+    state: str,
+    population: Optional[int],
+    lat: Optional[float],
+    lon: Optional[float],
+) -> dict:
+    """lookup_budget memoized on its inputs, with coordinates rounded to COORD_CACHE_DECIMALS."""
+    # Nearly every posting has its own raw coordinates; rounding lets nearby ones share an entry
+    if lat is not None:
+        lat = round(lat, COORD_CACHE_DECIMALS)
+    if lon is not None:
+        lon = round(lon, COORD_CACHE_DECIMALS)
+    return _lookup_budget_memo(city, state, population, lat, lon)
+
+
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def _lookup_budget_memo(
+    city: str,
+    state: str,
+    population: Optional[int],
+    lat: Optional[float],
+    lon: Optional[float],
+) -> dict:
+    return lookup_budget(city, state, population=population, lat=lat, lon=lon)
+
+
+@lru_cache(maxsize=None)
+def _issues_json(issues: tuple) -> str:
+    """JSON for a data_quality_issues list; rows share a handful of distinct lists."""
+    return json.dumps(list(issues))
+
+
+def process_row(
+    row: dict,
+    emp_class: Optional[dict] = None,
+    coords: Optional[tuple] = None,
+    census: Optional[dict] = None,
+    stats: bool = True,
+) -> dict:
     """
     Apply all Layer 2 and Layer 3 enrichment to a single row.
     
     Args:
-        row: Dict containing LLM-enriched job data
+        row: Dict containing LLM-enriched job data (enriched in place)
+        emp_class: Precomputed classify_employer() result for the row's employer
+        coords: Precomputed (lat, lon) for the row (see _parse_coords)
+        census: Precomputed Census lookup for municipal rows (see _census_lookups)
+        stats: Apply Layer 3 here (process_rows does it for a whole batch instead)
     
     Returns:
-        Dict with all new metadata columns added
+        The same dict with all new metadata columns added
     """
-    result = dict(row)  # Copy original
+    result = row  # Callers build a fresh dict per row, so no copy is needed
+    row_get = row.get
     
     # Layer 2a: Employer classification
-    employer = row.get("employer", "")
-    emp_class = classify_employer(employer)
-    result["employer_type_detected"] = emp_class["employer_type_detected"]
-    result["canonical_employer_name"] = emp_class["canonical_employer_name"]
+    if emp_class is None:
+        emp_class = classify_employer(row_get("employer", ""))
+    emp_type = emp_class["employer_type_detected"]
+    canonical = emp_class["canonical_employer_name"]
+    result["employer_type_detected"] = emp_type
+    result["canonical_employer_name"] = canonical
     
     # Layer 2b & 2c: Census Population and Budget Lookup
     # ONLY for City/Municipal Government. Non-municipal employers (State, County, etc.) should not have these stats.
     
-    city = row.get("city", "")
-    state = row.get("state", "")
-
-    # Initialize defaults
-    result["census_population"] = None
-    result["census_median_household_income"] = None
-    result["census_place_fips"] = None
-    result["census_match_confidence"] = 0
-    result["census_matched_name"] = None
-    result["population_band"] = "Unknown"
-    result["total_expenditure"] = None
-    result["per_capita_expenditure"] = None
-    result["budget_source"] = None
-    result["employer_lat"] = None
-    result["employer_lon"] = None
-
-    if emp_class["employer_type_detected"] in ["City/Municipal Government", "County Government"]:
-        lookup_city = emp_class["canonical_employer_name"] or city or ""
+    city = row_get("city", "")
+    state = row_get("state", "")
+
+    # Initialize defaults (final values for every non-municipal row)
+    result.update(LOOKUP_DEFAULTS)
+
+    if emp_type in LOOKUP_EMPLOYER_TYPES:
+        lookup_city = canonical or city or ""
         
         # Adjust name for County lookup logic (DB has "X COUNTY")
-        if emp_class["employer_type_detected"] == "County Government":
+        if emp_type == "County Government":
             # Check if we need to append suffix
             lower_name = lookup_city.lower()
             if not lower_name.endswith(" county") and not lower_name.endswith(" parish"):
@@ -131,8 +218,9 @@ def process_row(row: dict) -> dict:
         # Verified DB has population.
         
         # Census Lookup wrapper
-        if emp_class["employer_type_detected"] == "City/Municipal Government":
-             census = lookup_population(lookup_city, state)
+        if emp_type == "City/Municipal Government":
+             if census is None:
+                 census = _lookup_population_cached(lookup_city, state)
         else:
              # For Counties, we don't have a reliable 'lookup_county_population' yet.
              # We'll pass None and rely on Budget DB's internal population if available.
@@ -144,119 +232,315 @@ def process_row(row: dict) -> dict:
                  "census_matched_name": None
              }
 
-        result["census_population"] = census["census_population"]
-        result["census_median_household_income"] = census.get("census_median_income")
-        result["census_place_fips"] = census["census_place_fips"]
-        result["census_match_confidence"] = census["census_match_confidence"]
-        result["census_matched_name"] = census["census_matched_name"]
+        population = census["census_population"]
+        result.update({
+            "census_population": population,
+            "census_median_household_income": census.get("census_median_income"),
+            "census_place_fips": census["census_place_fips"],
+            "census_match_confidence": census["census_match_confidence"],
+            "census_matched_name": census["census_matched_name"],
+        })
         
         # Population Band
-        if census["census_population"]:
-            result["population_band"] = get_population_band(census["census_population"])
+        if population:
+            result["population_band"] = census.get("population_band") or get_population_band(population)
 
         # Budget Lookup
-        try:
-            lat = float(row.get("latitude")) if row.get("latitude") else None
-            lon = float(row.get("longitude")) if row.get("longitude") else None
-        except (ValueError, TypeError):
-            lat, lon = None, None
+        if coords is not None:
+            lat, lon = coords
+        else:
+            lat_raw = row_get("latitude")
+            lon_raw = row_get("longitude")
+            try:
+                lat = float(lat_raw) if lat_raw else None
+                lon = float(lon_raw) if lon_raw else None
+            except (ValueError, TypeError):
+                lat, lon = None, None
 
-        budget = lookup_budget(
+        budget = _lookup_budget_cached(
             lookup_city, 
             state, 
-            population=census["census_population"],
-            lat=lat,
-            lon=lon
+            population,
+            lat,
+            lon
         )
         
-        result["total_expenditure"] = budget.get("total_expenditure")
-        result["per_capita_expenditure"] = budget.get("per_capita_expenditure")
-        result["budget_source"] = budget.get("budget_source")
-        result["employer_lat"] = budget.get("employer_lat")
-        result["employer_lon"] = budget.get("employer_lon")
+        budget_get = budget.get
+        result.update({
+            "total_expenditure": budget_get("total_expenditure"),
+            "per_capita_expenditure": budget_get("per_capita_expenditure"),
+            "budget_source": budget_get("budget_source"),
+            "employer_lat": budget_get("employer_lat"),
+            "employer_lon": budget_get("employer_lon"),
+        })
     
     # Layer 3: Statistical processing
-    stats = process_statistical_enrichment(result)
-    result.update(stats)
-    
-    # Convert data_quality_issues list to JSON string for CSV
-    if isinstance(result.get("data_quality_issues"), list):
-        result["data_quality_issues"] = json.dumps(result["data_quality_issues"])
+    if stats:
+        result.update(process_statistical_enrichment(result))
     
     return result
 
 
+def process_rows(batch: list) -> list[dict]:
+    """
+    process_row for a batch of (row, emp_class, coords, census) argument tuples,
+    with Layer 3 statistical processing run over the whole batch at once.
+    """
+    results = [process_row(*args, stats=False) for args in batch]
+    
+    stats_input = pd.DataFrame(
+        {col: [result.get(col) for result in results] for col in STATS_INPUT_COLUMNS},
+        dtype=object,
+    )
+    stats = process_statistical_enrichment_batch(stats_input).to_dict("records")
+    for result, row_stats in zip(results, stats):
+        result.update(row_stats)
+    return results
+
+
+def _batched(iterable, size: int):
+    """Yield lists of up to size items (itertools.batched needs Python 3.12)."""
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _parse_coords(df: pd.DataFrame) -> list[tuple]:
+    """
+    Parse latitude/longitude for a whole chunk at once.
+    
+    Missing, zero or unparseable values become None; an unparseable value in
+    either column drops both, matching the per-row float() fallback in process_row.
+    """
+    parsed = {}
+    bad = pd.Series(False, index=df.index)
+    for col in ("latitude", "longitude"):
+        if col in df.columns:
+            raw = df[col]
+            num = pd.to_numeric(raw, errors="coerce").astype(float)
+            bad |= num.isna() & raw.notna()
+            # A numeric 0 is falsy and was skipped per row; the string "0" was not
+            num = num.mask(raw == 0)
+        else:
+            num = pd.Series(float("nan"), index=df.index)
+        parsed[col] = num
+    
+    lat = parsed["latitude"].mask(bad)
+    lon = parsed["longitude"].mask(bad)
+    return list(zip(
+        lat.astype(object).where(lat.notna(), None).tolist(),
+        lon.astype(object).where(lon.notna(), None).tolist(),
+    ))
+
+
+def _census_lookups(df: pd.DataFrame, emp_classes: list) -> list:
+    """
+    Resolve Census lookups and population bands for a chunk's municipal rows,
+    once per distinct (city, state).
+    
+    Non-municipal rows get None. Lookups run in the parent process, so pool
+    workers never repeat them.
+    """
+    n = len(df)
+    cities = df["city"].tolist() if "city" in df.columns else [""] * n
+    states = df["state"].tolist() if "state" in df.columns else [""] * n
+    
+    keys = [
+        (emp_class["canonical_employer_name"] or city or "", state)
+        if emp_class["employer_type_detected"] == "City/Municipal Government" else None
+        for emp_class, city, state in zip(emp_classes, cities, states)
+    ]
+    census_by_key = {
+        key: _lookup_population_cached(*key)
+        for key in dict.fromkeys(keys) if key is not None
+    }
+    
+    # Population bands for every distinct lookup in one vectorized pass
+    if census_by_key:
+        bands = get_population_bands(pd.Series(
+            [census["census_population"] for census in census_by_key.values()], dtype=float
+        ))
+        census_by_key = {
+            key: {**census, "population_band": band}
+            for (key, census), band in zip(census_by_key.items(), bands.tolist())
+        }
+    return [census_by_key.get(key) if key is not None else None for key in keys]
+
+
+def _row_args(df: pd.DataFrame):
+    """Yield (row_dict, employer classification, coords, census) for every row of a chunk."""
+    # Classify each distinct employer once; postings from the same employer share the result
+    if "employer" in df.columns:
+        employers = df["employer"].fillna("")
+    else:
+        employers = pd.Series("", index=df.index)
+    class_map = {e: classify_employer(e) for e in employers.unique()}
+    emp_classes = employers.map(class_map).tolist()
+    
+    coords = _parse_coords(df)
+    censuses = _census_lookups(df, emp_classes)
+    
+    # itertuples + zip avoids building a Series per row like iterrows does
+    cols = list(df.columns)
+    dict_, zip_ = dict, zip
+    for row, emp_class, row_coords, census in zip_(
+        df.itertuples(index=False, name=None), emp_classes, coords, censuses
+    ):
+        yield dict_(zip_(cols, row)), emp_class, row_coords, census
+
+
+def _merge_dtypes(a, b):
+    """Dtype of a column whose chunks parsed as a and b, as a whole-file parse infers it."""
+    if a == b:
+        return a
+    # An int chunk next to a float one (e.g. a chunk with a blank) is float overall
+    if a.kind in "iuf" and b.kind in "iuf":
+        return np.result_type(a, b)
+    return np.dtype(object)
+
+
+def _scan_input(input_path: Path, limit: Optional[int] = None) -> tuple[dict, int, list]:
+    """
+    One chunked pass over the input ahead of processing.
+    
+    Returns the whole-file dtype of every column (so every chunk of the processing
+    pass is parsed, and formatted on output, the same way), the row count, and the
+    distinct non-null states.
+    """
+    dtypes = {}
+    row_count = 0
+    states = {}
+    for chunk in pd.read_csv(input_path, nrows=limit or None, chunksize=READ_CHUNKSIZE):
+        row_count += len(chunk)
+        for col, dtype in chunk.dtypes.items():
+            dtypes[col] = _merge_dtypes(dtypes[col], dtype) if col in dtypes else dtype
+        if "state" in chunk.columns:
+            states.update(dict.fromkeys(chunk["state"].dropna().unique()))
+    return dtypes, row_count, list(states)
+
+
 def process_file(
     input_path: Path,
     output_path: Path,
     limit: Optional[int] = None,
+    workers: Optional[int] = None,
 ) -> None:
     """
     Process an entire CSV file through the metadata/stats pipeline.
     
+    Rows are read, enriched and written READ_CHUNKSIZE at a time, so memory stays
+    bounded regardless of file size. A first chunked pass pins each column's dtype
+    to what the whole file infers, so formatting does not change between chunks.
+    
     Args:
         input_path: Path to LLM-enriched CSV
         output_path: Path for final output CSV
         limit: Optional row limit for testing
+        workers: Worker processes (default: CPU count; 1 = run in this process)
     """
     print(f"Loading {input_path}...")
-    df = pd.read_csv(input_path)
-    total_rows = len(df)
-    print(f"Loaded {total_rows} rows")
-    
     if limit:
         print(f"Limiting to first {limit} rows")
-        df = df.head(limit)
-        total_rows = len(df)
     
     # Determine output columns
-    input_columns = list(df.columns)
+    input_columns = list(pd.read_csv(input_path, nrows=0).columns)
     raw_output_cols = input_columns + [c for c in METADATA_COLUMNS if c not in input_columns]
     output_columns = [OUTPUT_COLUMN_MAP.get(c, c) for c in raw_output_cols]
+    issues_idx = raw_output_cols.index("data_quality_issues")
+    float_idxs = [raw_output_cols.index(c) for c in FLOAT_OUTPUT_COLUMNS]
     
-    # Process rows
-    print(f"\nProcessing {total_rows} rows...")
-    processed_rows = []
+    dtypes, total_rows, states = _scan_input(input_path, limit)
     
-    for idx, row in tqdm(df.iterrows(), total=total_rows, desc="Enriching metadata"):
-        row_dict = row.to_dict()
-        enriched = process_row(row_dict)
-        
-        # Rename columns as requested
-        # Create a new dict with mapped keys
-        final_row = {}
-        for k, v in enriched.items():
-            final_row[OUTPUT_COLUMN_MAP.get(k, k)] = v
-        
-        processed_rows.append(final_row)
+    # Warm the Census place cache for every state in the file in parallel
+    # (before any worker processes are forked, so they all inherit it)
+    if states:
+        prefetch_states(states)
     
-    # Write output
-    print(f"\nWriting output to {output_path}...")
-    output_df = pd.DataFrame(processed_rows)
+    # Process rows
+    print(f"\nProcessing rows, writing output to {output_path}...")
+    workers = workers or os.cpu_count() or 1
+    pool = None
     
-    # Ensure column order
-    for col in output_columns:
-        if col not in output_df.columns:
-            output_df[col] = None
-    output_df = output_df[output_columns]
+    processed_count = 0
+    confidence_sum = 0.0
+    confidence_count = 0
+    pop_found = 0
     
-    output_df.to_csv(output_path, index=False)
+    try:
+        with open(output_path, "w", newline="", encoding="utf-8") as fh, \
+                tqdm(total=total_rows, desc="Enriching metadata", unit=" rows") as pbar:
+            # "\n" line endings, as DataFrame.to_csv wrote them
+            writer = csv.writer(fh, lineterminator="\n")
+            # Header uses the renamed columns (OUTPUT_COLUMN_MAP)
+            writer.writerow(output_columns)
+            
+            for chunk in pd.read_csv(
+                input_path, nrows=limit or None, chunksize=READ_CHUNKSIZE, dtype=dtypes
+            ):
+                if pool is None and workers > 1 and len(chunk) > POOL_CHUNKSIZE:
+                    # Load the budget data before forking so every worker shares the parent's copy
+                    get_budget_enricher()
+                    pool = multiprocessing.Pool(processes=workers)
+                
+                chunk_start = processed_count
+                row_args = _row_args(chunk)
+                if pool is not None:
+                    enriched_rows = chain.from_iterable(
+                        pool.imap(process_rows, _batched(row_args, POOL_CHUNKSIZE))
+                    )
+                else:
+                    enriched_rows = process_rows(list(row_args))
+                
+                for enriched in enriched_rows:
+                    # Project onto the output schema in one pass; NaN (v != v) is written
+                    # as an empty field, like DataFrame.to_csv does
+                    values = [v if v == v else "" for v in map(enriched.get, raw_output_cols)]
+                    # data_quality_issues stays a list through process_row; serialize it for CSV here
+                    issues = values[issues_idx]
+                    if isinstance(issues, list):
+                        values[issues_idx] = _issues_json(tuple(issues))
+                    for i in float_idxs:
+                        if isinstance(values[i], int):
+                            values[i] = float(values[i])
+                    writer.writerow(values)
+                    
+                    # Running totals for the summary
+                    processed_count += 1
+                    confidence = enriched.get("data_confidence_score")
+                    if confidence is not None:
+                        confidence_sum += confidence
+                        confidence_count += 1
+                    population = enriched.get("census_population")
+                    if population is not None and population == population:
+                        pop_found += 1
+                
+                # One progress update per chunk keeps tqdm out of the per-row loop
+                pbar.update(processed_count - chunk_start)
+    except BaseException:
+        # Failed or interrupted: stop the workers without waiting for them
+        if pool is not None:
+            pool.terminate()
+        raise
+    else:
+        # Every result has been consumed; let the workers exit cleanly
+        if pool is not None:
+            pool.close()
+            pool.join()
     
     # Summary stats
     print(f"\n{'='*60}")
     print("COMPLETE!")
     print(f"{'='*60}")
-    print(f"Processed: {len(processed_rows)} rows")
+    print(f"Processed: {processed_count} rows")
     print(f"Output: {output_path}")
     
     # Data quality summary
-    if "data_confidence_score" in output_df.columns:
-        avg_confidence = output_df["data_confidence_score"].mean()
+    if confidence_count:
+        avg_confidence = confidence_sum / confidence_count
         print(f"Average confidence score: {avg_confidence:.1f}")
     
-    if "census_population" in output_df.columns:
-        pop_found = output_df["census_population"].notna().sum()
-        print(f"Census matches: {pop_found}/{len(output_df)} ({100*pop_found/len(output_df):.1f}%)")
+    if processed_count:
+        print(f"Census matches: {pop_found}/{processed_count} ({100*pop_found/processed_count:.1f}%)")
 
 
 def main():
@@ -266,6 +550,8 @@ def main():
     parser.add_argument("--input", "-i", required=True, help="Input LLM-enriched CSV")
     parser.add_argument("--output", "-o", required=True, help="Output CSV path")
     parser.add_argument("--limit", "-l", type=int, help="Limit rows (for testing)")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
     
     args = parser.parse_args()
     
@@ -276,7 +562,7 @@ def main():
         print(f"Error: Input file not found: {input_path}")
         return
     
-    process_file(input_path, output_path, args.limit)
+    process_file(input_path, output_path, args.limit, args.workers)
 
 
 if __name__ == "__main__":
@@ -3,6 +3,9 @@ LLM prompt templates for municipal job compensation analysis.
 Enhanced with constrained enums and structured output format.
 """
 
+from itertools import chain
+from string import Formatter
+
 from config import JOB_FAMILIES, JOB_LEVELS, EMPLOYER_TYPES, DBM_BANDS, PENSION_TYPES
 
 # Format the enums for the prompt
@@ -159,6 +162,16 @@ JOB DESCRIPTION
 ═══════════════════════════════════════════════════════════════════════════════
 Extract the compensation factors following the constrained enums and structured format. Return valid JSON only."""
 
+# USER_MESSAGE_TEMPLATE split once into literal fragments and the fields between them,
+# so build_messages joins strings instead of re-parsing the template on every call
+_USER_TEMPLATE_PARTS = [(literal, field) for literal, field, _, _ in Formatter().parse(USER_MESSAGE_TEMPLATE)]
+_USER_LITERALS = tuple(literal for literal, field in _USER_TEMPLATE_PARTS if field is not None)
+_USER_FIELDS = tuple(field for _, field in _USER_TEMPLATE_PARTS if field is not None)
+_USER_TAIL = "" if _USER_TEMPLATE_PARTS[-1][1] is not None else _USER_TEMPLATE_PARTS[-1][0]
+
+# The system message never changes, so every call shares one dict
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
 
 def build_messages(
     job_title: str,
@@ -188,19 +201,22 @@ def build_messages(
         elif salary_max:
             salary_info = f"Up to ${salary_max} {salary_type}"
     
+    values = {
+        "job_title": job_title or "Not specified",
+        "employer": employer or "Not specified",
+        "department": department or "Not specified",
+        "job_type": job_type or "Not specified",
+        "city": city or "Not specified",
+        "state": state or "Not specified",
+        "salary_info": salary_info,
+        "description": description,
+    }
+    content = "".join(chain(
+        chain.from_iterable(zip(_USER_LITERALS, map(values.__getitem__, _USER_FIELDS))),
+        (_USER_TAIL,),
+    ))
+    
     return [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {
-            "role": "user",
-            "content": USER_MESSAGE_TEMPLATE.format(
-                job_title=job_title or "Not specified",
-                employer=employer or "Not specified",
-                department=department or "Not specified",
-                job_type=job_type or "Not specified",
-                city=city or "Not specified",
-                state=state or "Not specified",
-                salary_info=salary_info,
-                description=description,
-            ),
-        },
+        _SYSTEM_MESSAGE,
+        {"role": "user", "content": content},
     ]
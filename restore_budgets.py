@@ -1,12 +1,23 @@
 import pandas as pd
-import csv
 import os
 
+from state_fips import FIPS_TO_STATE
+
 # Files
 PID_PATH = "budget_registry/data/raw/Fin_PID_2023.txt"
 FIN_PATH = "budget_registry/data/raw/2023_Finance_Data.txt"
 CSV_PATH = "budget_registry/data/processed/municipal_budgets.csv"
 
+# Read buffer for the large raw Census files (default is 8 KiB)
+READ_BUFFER_SIZE = 1 << 18
+
+# Government type digit (3rd char of GOV_ID) to restore: 1=County, 2=Muni, 3=Township
+TARGET_GOV_TYPES = frozenset('123')
+
+# Padded whole-number field; the padding class is the whitespace int() skips
+# (str.isspace() minus the \x1c-\x1f separators)
+INT_FIELD_RE = r'[^\S\x1c-\x1f]*[+-]?\d+(?:_\d+)*[^\S\x1c-\x1f]*'
+
 # Load existing IDs to avoid duplicates
 existing_ids = set()
 state_map = {} # '01' -> 'AL'
@@ -14,35 +25,27 @@ state_map = {} # '01' -> 'AL'
 print(f"Loading existing data from {CSV_PATH}...")
 if os.path.exists(CSV_PATH):
     try:
-        df = pd.read_csv(CSV_PATH, dtype=str)
         # Assuming header: GOV_ID,Name,State,Census_State,...
+        # Only parse the columns used below (whichever of them the file has)
+        header = pd.read_csv(CSV_PATH, nrows=0).columns
+        usecols = [c for c in ('GOV_ID', 'State', 'Census_State') if c in header]
+        df = pd.read_csv(CSV_PATH, dtype=str, usecols=usecols, engine='c')
         if 'GOV_ID' in df.columns:
-            existing_ids = set(df['GOV_ID'].dropna().unique())
+            # The set dedups on its own; skip the extra unique() pass
+            existing_ids = set(df['GOV_ID'].dropna().tolist())
         
-        # Build State Map
-        for _, row in df.iterrows():
-            if pd.notna(row.get('Census_State')) and pd.notna(row.get('State')):
-                code = row['Census_State'].zfill(2)
-                abbrev = row['State']
-                if len(code) == 2 and len(abbrev) == 2:
-                    state_map[code] = abbrev
+        # Build State Map (later rows win, as with a row-by-row fill)
+        if 'Census_State' in df.columns and 'State' in df.columns:
+            sub = df[['Census_State', 'State']].dropna()
+            codes = sub['Census_State'].str.zfill(2)
+            abbrevs = sub['State']
+            valid = (codes.str.len() == 2) & (abbrevs.str.len() == 2)
+            state_map.update(zip(codes[valid], abbrevs[valid]))
     except Exception as e:
         print(f"Error reading CSV: {e}")
 
 # Fallback State Map if incomplete
-DEFAULT_STATES = {
-    '01': 'AL', '02': 'AK', '04': 'AZ', '05': 'AR', '06': 'CA',
-    '08': 'CO', '09': 'CT', '10': 'DE', '11': 'DC', '12': 'FL',
-    '13': 'GA', '15': 'HI', '16': 'ID', '17': 'IL', '18': 'IN',
-    '19': 'IA', '20': 'KS', '21': 'KY', '22': 'LA', '23': 'ME',
-    '24': 'MD', '25': 'MA', '26': 'MI', '27': 'MN', '28': 'MS',
-    '29': 'MO', '30': 'MT', '31': 'NE', '32': 'NV', '33': 'NH',
-    '34': 'NJ', '35': 'NM', '36': 'NY', '37': 'NC', '38': 'ND',
-    '39': 'OH', '40': 'OK', '41': 'OR', '42': 'PA', '44': 'RI',
-    '45': 'SC', '46': 'SD', '47': 'TN', '48': 'TX', '49': 'UT',
-    '50': 'VT', '51': 'VA', '53': 'WA', '54': 'WV', '55': 'WI',
-    '56': 'WY'
-}
+DEFAULT_STATES = FIPS_TO_STATE
 # Merge defaults
 for k, v in DEFAULT_STATES.items():
     if k not in state_map:
@@ -53,25 +56,20 @@ print(f"Found {len(existing_ids)} existing records.")
 # 1. Parse PID to get names of ALL Municipalities (Type 2) and Townships (Type 3)
 entity_map = {} # ID -> Name
 print(f"Scanning {PID_PATH}...")
-count_found = 0
 try:
-    with open(PID_PATH, 'r', encoding='latin1') as f:
-        for line in f:
-            if len(line) < 12: continue
-            gid = line[:12]
-            
-            # Filter by Type (3rd digit, index 2)
-            # 1=County, 2=Muni, 3=Township
-            gov_type = gid[2]
-            if gov_type not in ['1', '2', '3']:
-                continue
-                
-            # Extract Name (Chars 12-76 based on inspection, strip whitespace)
-            name_raw = line[12:76]
-            name = name_raw.strip()
-            
-            entity_map[gid] = name
-            count_found += 1
+    with open(PID_PATH, 'r', encoding='latin1', buffering=READ_BUFFER_SIZE) as f:
+        # Raw lines (newline kept, so the length check matches line-by-line reading);
+        # object dtype keeps Python's str.strip() whitespace rules
+        lines = pd.Series(f.readlines(), dtype=object)
+    lines = lines[lines.str.len() >= 12]
+    gids = lines.str[:12]
+
+    # Filter by Type (3rd digit, index 2)
+    is_target = gids.str[2].isin(TARGET_GOV_TYPES)
+
+    # Extract Name (Chars 12-76 based on inspection, strip whitespace)
+    names = lines[is_target].str[12:76].str.strip()
+    entity_map = dict(zip(gids[is_target], names))
 except FileNotFoundError:
     print(f"PID file not found: {PID_PATH}")
     exit(1)
@@ -79,50 +77,52 @@ except FileNotFoundError:
 print(f"Identified {len(entity_map)} potential entities (Type 2/3).")
 
 # 2. Scan Finance Data for Budgets
-restorable = []
+restorable = pd.DataFrame()
 print(f"Scanning {FIN_PATH}...")
 count_matches = 0
 
 try:
-    with open(FIN_PATH, 'r', encoding='latin1') as f:
-        for line in f:
-            line = line.strip()
-            if len(line) < 20: continue
-            
-            gid = line[:12]
-            
-            # Skip if already in CSV
-            if gid in existing_ids:
-                continue
-            
-            # Skip if not a target entity
-            if gid not in entity_map:
-                continue
-            
-            # Parse Code
-            code = line[12:15]
-            if code != '49U': continue
-            
-            # Parse Value
-            rest = line[15:]
-            if len(rest) < 5: continue
-            value_str = rest[:-5].strip()
-            
-            try:
-                val = int(value_str) * 1000
-                if val > 0:
-                    name = entity_map[gid]
-                    state_code = gid[:2]
-                    state_abbrev = state_map.get(state_code, 'XX')
-                    
-                    # Columns: GOV_ID,Name,State,Census_State,Total_Expenditure,Population,Per_Capita,Latitude,Longitude
-                    restorable.append([
-                        gid, name, state_abbrev, state_code, val, "", "", "", ""
-                    ])
-                    existing_ids.add(gid) # Prevent dupes if multiples
-                    count_matches += 1
-            except:
-                continue
+    with open(FIN_PATH, 'rb', buffering=READ_BUFFER_SIZE) as f:
+        # Only lines containing the 49U code can match; the rest are never decoded
+        lines = [line.decode('latin1') for line in f if b'49U' in line]
+    lines = pd.Series(lines, dtype=object).str.strip()
+    lines = lines[lines.str.len() >= 20]
+    gids = lines.str[:12]
+    
+    # Budget lines (code 49U) for target entities that are not already in the CSV
+    is_candidate = (
+        (lines.str[12:15] == '49U')
+        & gids.isin(list(entity_map))
+        & ~gids.isin(list(existing_ids))
+    )
+    fin = pd.DataFrame({
+        'gid': gids[is_candidate],
+        # Parse Value (everything between the code and the 5 trailing chars)
+        'value': lines[is_candidate].str[15:-5],
+    })
+    
+    # Whole numbers only (what int() accepted), in thousands of dollars;
+    # the padding is left for the int parse to skip instead of stripped first
+    fin = fin[fin['value'].str.fullmatch(INT_FIELD_RE).astype(bool)]
+    fin['val'] = fin['value'].astype('int64') * 1000
+    
+    # First positive budget per entity (prevent dupes if multiples)
+    fin = fin[fin['val'] > 0].drop_duplicates('gid')
+    
+    state_codes = fin['gid'].str[:2]
+    restorable = pd.DataFrame({
+        'GOV_ID': fin['gid'],
+        'Name': fin['gid'].map(entity_map),
+        'State': state_codes.map(state_map).fillna('XX'),
+        'Census_State': state_codes,
+        'Total_Expenditure': fin['val'],
+        'Population': "",
+        'Per_Capita': "",
+        'Latitude': "",
+        'Longitude': "",
+    })
+    existing_ids.update(fin['gid'])
+    count_matches = len(restorable)
 except FileNotFoundError:
     print(f"Finance file not found: {FIN_PATH}")
     exit(1)
@@ -131,16 +131,12 @@ print(f"Found {count_matches} new budgets to restore.")
 
 # 3. Append
 # 3. Append / Create
-if restorable:
-    mode = 'a'
+if not restorable.empty:
     write_header = not os.path.exists(CSV_PATH)
     
     print(f"Writing {len(restorable)} rows to {CSV_PATH}...")
-    with open(CSV_PATH, mode, newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        if write_header:
-            writer.writerow(['GOV_ID', 'Name', 'State', 'Census_State', 'Total_Expenditure', 'Population', 'Per_Capita', 'Latitude', 'Longitude'])
-        writer.writerows(restorable)
+    # \r\n line endings match the rows csv.writer appended before
+    restorable.to_csv(CSV_PATH, mode='a', header=write_header, index=False, lineterminator='\r\n')
     print("Done.")
 else:
     print("No new records found.")
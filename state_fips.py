@@ -0,0 +1,31 @@
+"""
+State FIPS Codes
+
+Single source of truth for two-letter state abbreviation -> Census state FIPS code,
+shared by the Census lookup, budget lookup, and budget restore scripts.
+"""
+
+# State FIPS codes (50 states + DC)
+STATE_FIPS = {
+    "AL": "01", "AK": "02", "AZ": "04", "AR": "05", "CA": "06",
+    "CO": "08", "CT": "09", "DE": "10", "DC": "11", "FL": "12",
+    "GA": "13", "HI": "15", "ID": "16", "IL": "17", "IN": "18",
+    "IA": "19", "KS": "20", "KY": "21", "LA": "22", "ME": "23",
+    "MD": "24", "MA": "25", "MI": "26", "MN": "27", "MS": "28",
+    "MO": "29", "MT": "30", "NE": "31", "NV": "32", "NH": "33",
+    "NJ": "34", "NM": "35", "NY": "36", "NC": "37", "ND": "38",
+    "OH": "39", "OK": "40", "OR": "41", "PA": "42", "RI": "44",
+    "SC": "45", "SD": "46", "TN": "47", "TX": "48", "UT": "49",
+    "VT": "50", "VA": "51", "WA": "53", "WV": "54", "WI": "55",
+    "WY": "56",
+}
+
+# Upper- and lowercase keys, so already-normalized input skips .upper().strip()
+STATE_FIPS_ANY_CASE = {**STATE_FIPS, **{abbrev.lower(): fips for abbrev, fips in STATE_FIPS.items()}}
+
+# Reverse mapping: FIPS code -> state abbreviation
+FIPS_TO_STATE = {fips: abbrev for abbrev, fips in STATE_FIPS.items()}
+
+# Guard against the table drifting (a bad copy once mapped AL -> "10", CA -> "62")
+assert len(STATE_FIPS) == 51 and STATE_FIPS["AL"] == "01" and STATE_FIPS["CA"] == "06"
+assert len(FIPS_TO_STATE) == len(STATE_FIPS)
@@ -6,21 +6,77 @@ Implements data aging (ECI adjustment), salary normalization,
 data freshness tracking, and confidence scoring.
 """
 
+import bisect
 import json
+import re
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Optional, Any
 
+import numpy as np
+import pandas as pd
+
+# Optional: numba compiles the batch salary math into one fused loop
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 
 # BLS Employment Cost Index for State/Local Government
 # Source: https://www.bls.gov/eci/
 # 2023-2024 average annual increase is approximately 4%
 ECI_ANNUAL_RATE = 0.04
 
+# ECI growth factor keyed by data age in months. Ages are stored rounded to 0.1,
+# so every age up to 10 years is a table hit; anything else falls back to pow()
+_ECI_FACTORS = {
+    tenths / 10: (1 + ECI_ANNUAL_RATE) ** (tenths / 10 / 12)
+    for tenths in range(0, 1201)
+}
+
+# Data freshness bands by age in months; an age equal to an edge falls in the band above it
+_FRESHNESS_EDGES = (6, 12)
+_FRESHNESS_LABELS = ("Fresh", "Aging", "Stale")
+
+# First number in an hours-per-week string, e.g. "37.5 hours/week"
+_HOURS_RE = re.compile(r"(\d+\.?\d*)")
+
+
+@lru_cache(maxsize=10_000)
+def _parse_date(date_str: str) -> Optional[datetime]:
+    """
+    Parse a posting/closing/enrichment date to an aware datetime, or None.
+    
+    Accepts ISO timestamps (containing "T"), MM/DD/YYYY (only the date part is
+    read, so a trailing time is ignored) and YYYY-MM-DD; naive values are taken
+    as UTC. Anything else (e.g. "now", "March 4, 2025") is None. Postings share
+    dates heavily, so results are cached.
+    """
+    try:
+        if "T" in date_str:
+            # ISO format with time
+            data_date = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+        elif "/" in date_str:
+            # MM/DD/YYYY format
+            data_date = datetime.strptime(date_str.split()[0], "%m/%d/%Y")
+        else:
+            # YYYY-MM-DD format
+            data_date = datetime.strptime(date_str, "%Y-%m-%d")
+    except ValueError:
+        # Unparseable strings are cached as None too, so each one raises only once
+        return None
+    if data_date.tzinfo is None:
+        data_date = data_date.replace(tzinfo=timezone.utc)
+    return data_date
+
 
 def calculate_data_age(
     posting_date: Optional[str] = None,
     closing_date: Optional[str] = None,
     enriched_at: Optional[str] = None,
+    now: Optional[datetime] = None,
 ) -> dict:
     """
     Calculate age of salary data in months.
@@ -31,6 +87,8 @@ def calculate_data_age(
         posting_date: When job was posted (YYYY-MM-DD or ISO format)
         closing_date: Application deadline
         enriched_at: When enrichment ran (fallback)
+        now: Aware "current" time to measure age against (default: now, UTC);
+            batch callers pass one value for every row
     
     Returns:
         dict with:
@@ -45,40 +103,21 @@ def calculate_data_age(
             "data_freshness": "Unknown",
         }
     
-    try:
-        # Handle various date formats
-        if "T" in str(date_str):
-            # ISO format with time
-            data_date = datetime.fromisoformat(str(date_str).replace("Z", "+00:00"))
-        elif "/" in str(date_str):
-            # MM/DD/YYYY format
-            data_date = datetime.strptime(str(date_str).split()[0], "%m/%d/%Y")
-            data_date = data_date.replace(tzinfo=timezone.utc)
-        else:
-            # YYYY-MM-DD format
-            data_date = datetime.strptime(str(date_str), "%Y-%m-%d")
-            data_date = data_date.replace(tzinfo=timezone.utc)
-        
-        now = datetime.now(timezone.utc)
-        age_days = (now - data_date).days
-        age_months = age_days / 30.44  # Average days per month
-        
-        if age_months < 6:
-            freshness = "Fresh"
-        elif age_months < 12:
-            freshness = "Aging"
-        else:
-            freshness = "Stale"
-        
-        return {
-            "data_age_months": round(age_months, 1),
-            "data_freshness": freshness,
-        }
-    except Exception as e:
+    data_date = _parse_date(str(date_str))
+    if data_date is None:
         return {
             "data_age_months": None,
             "data_freshness": "Unknown",
         }
+    
+    now = now or datetime.now(timezone.utc)
+    age_days = (now - data_date).days
+    age_months = age_days / 30.44  # Average days per month
+    
+    return {
+        "data_age_months": round(age_months, 1),
+        "data_freshness": _FRESHNESS_LABELS[bisect.bisect_right(_FRESHNESS_EDGES, age_months)],
+    }
 
 
 def apply_eci_aging(
@@ -105,21 +144,29 @@ def apply_eci_aging(
     
     try:
         salary = float(salary)
-        age_years = float(data_age_months) / 12
-        
-        # Compound growth formula
-        factor = (1 + ECI_ANNUAL_RATE) ** age_years
-        adjusted = salary * factor
-        
-        return {
-            "salary_eci_adjusted": round(adjusted, 2),
-            "eci_adjustment_pct": round((factor - 1) * 100, 1),
-        }
+        age_months = float(data_age_months)
     except (ValueError, TypeError):
         return {
             "salary_eci_adjusted": None,
             "eci_adjustment_pct": 0.0,
         }
+    
+    # Compound growth formula
+    factor = _eci_factor(age_months)
+    adjusted = salary * factor
+    
+    return {
+        "salary_eci_adjusted": round(adjusted, 2),
+        "eci_adjustment_pct": round((factor - 1) * 100, 1),
+    }
+
+
+def _eci_factor(age_months: float) -> float:
+    """Compound ECI growth over age_months: (1 + ECI_ANNUAL_RATE) ** (age_months / 12)."""
+    factor = _ECI_FACTORS.get(age_months)
+    if factor is None:
+        factor = (1 + ECI_ANNUAL_RATE) ** (age_months / 12)
+    return factor
 
 
 def parse_hours(hours_str: Optional[str]) -> float:
@@ -134,8 +181,7 @@ def parse_hours(hours_str: Optional[str]) -> float:
         return 40.0
     
     # Try to extract first number
-    import re
-    match = re.search(r"(\d+\.?\d*)", hours_str)
+    match = _HOURS_RE.search(hours_str)
     if match:
         return float(match.group(1))
     
@@ -166,24 +212,24 @@ def normalize_salary(
     
     try:
         salary = float(salary)
-        hours = parse_hours(hours_per_week)
-        
-        # Calculate hourly rate
-        annual_hours = hours * 52
-        hourly = salary / annual_hours
-        
-        # Normalize to 40-hour week
-        standard_annual = hourly * 40 * 52
-        
-        return {
-            "effective_hourly_rate": round(hourly, 2),
-            "salary_40hr_equivalent": round(standard_annual, 0),
-        }
     except (ValueError, TypeError):
         return {
             "effective_hourly_rate": None,
             "salary_40hr_equivalent": None,
         }
+    hours = parse_hours(hours_per_week)
+    
+    # Calculate hourly rate
+    annual_hours = hours * 52
+    hourly = salary / annual_hours
+    
+    # Normalize to 40-hour week
+    standard_annual = hourly * 40 * 52
+    
+    return {
+        "effective_hourly_rate": round(hourly, 2),
+        "salary_40hr_equivalent": round(standard_annual, 0),
+    }
 
 
 def calculate_confidence_score(row: dict) -> dict:
@@ -217,7 +263,7 @@ def calculate_confidence_score(row: dict) -> dict:
     census_conf = row.get("census_match_confidence", 0)
     try:
         census_conf = float(census_conf) if census_conf else 0
-    except:
+    except (ValueError, TypeError):
         census_conf = 0
     
     if census_conf < 75:
@@ -248,12 +294,13 @@ def calculate_confidence_score(row: dict) -> dict:
     }
 
 
-def process_statistical_enrichment(row: dict) -> dict:
+def process_statistical_enrichment(row: dict, now: Optional[datetime] = None) -> dict:
     """
     Apply all statistical processing to an enriched row.
     
     Args:
         row: Dict containing already-enriched job data
+        now: Aware "current" time for data aging (default: now, UTC)
     
     Returns:
         dict with all statistical enrichment fields
@@ -265,6 +312,7 @@ def process_statistical_enrichment(row: dict) -> dict:
         posting_date=row.get("posting_date") or row.get("opening_date"),
         closing_date=row.get("closing_date"),
         enriched_at=row.get("enriched_at"),
+        now=now,
     )
     result.update(age_info)
     
@@ -297,6 +345,263 @@ def process_statistical_enrichment(row: dict) -> dict:
     return result
 
 
+# Row fields read by process_statistical_enrichment
+STATS_INPUT_COLUMNS = (
+    "posting_date",
+    "opening_date",
+    "closing_date",
+    "enriched_at",
+    "salary_min",
+    "salary_max",
+    "hours_per_week",
+    "compensation_summary",
+    "census_match_confidence",
+    "employer_type_detected",
+)
+
+
+# data_quality_issues flags, in the order calculate_confidence_score reports them
+_ISSUE_NO_SUMMARY = 1
+_ISSUE_LOW_CENSUS = 2
+_ISSUE_STALE = 4
+_ISSUE_UNKNOWN_AGE = 8
+_ISSUE_NO_SALARY = 16
+_ISSUE_UNKNOWN_EMPLOYER = 32
+
+
+def _object_column(df: pd.DataFrame, name: str) -> np.ndarray:
+    """df[name] as an object array (all None if the column is missing)."""
+    if name in df.columns:
+        return df[name].to_numpy(dtype=object)
+    return np.full(len(df), None, dtype=object)
+
+
+def _first_truthy(*columns: np.ndarray) -> np.ndarray:
+    """Element-wise `a or b or ...` over aligned object arrays."""
+    result = columns[0]
+    for column in columns[1:]:
+        result = np.where(result.astype(bool), result, column)
+    return result
+
+
+def _map_unique(values: np.ndarray, func) -> list:
+    """func(value) for every element, calling func once per distinct value."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    results = [func(value) for value in uniques]
+    return [results[code] for code in codes]
+
+
+def _round_like_python(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """Python's round(value, ndigits) element-wise; np.round can differ on ties (6.525 -> 6.52)."""
+    return np.array([round(value, ndigits) for value in values.tolist()], dtype=float)
+
+
+def _salary_kernel(
+    min_values: np.ndarray,
+    max_values: np.ndarray,
+    norm_values: np.ndarray,
+    factor: np.ndarray,
+    hours: np.ndarray,
+    age_min: np.ndarray,
+    age_max: np.ndarray,
+    max_is_number: np.ndarray,
+) -> tuple:
+    """
+    ECI aging and 40-hour normalization over whole columns, before rounding.
+    
+    Plain numpy, so it runs as-is without numba; with numba it is compiled
+    (see below) and the expressions fuse into one pass. Rounding is left to
+    the caller (_round_like_python), so both builds round like the per-row path.
+    """
+    salary_min_eci = np.where(age_min, min_values * factor, np.nan)
+    salary_max_eci = np.where(age_max, max_values * factor, np.nan)
+    eci_pct = np.where(age_max & max_is_number, (factor - 1) * 100, 0.0)
+    
+    hourly = norm_values / (hours * 52)
+    return salary_min_eci, salary_max_eci, eci_pct, hourly, hourly * 40 * 52
+
+
+if HAS_NUMBA:
+    # No fastmath: unrounded results must stay bit-identical to the per-row arithmetic
+    _salary_kernel = njit(cache=True)(_salary_kernel)
+
+
+def process_statistical_enrichment_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply process_statistical_enrichment to every row of a DataFrame at once.
+    
+    Dates and hours strings are parsed once per distinct value, and ECI aging
+    and salary normalization run as array math.
+    
+    Args:
+        df: Enriched job records (see STATS_INPUT_COLUMNS for the fields read)
+    
+    Returns:
+        DataFrame on the same index with all statistical enrichment columns
+    """
+    def column(name: str) -> np.ndarray:
+        return _object_column(df, name)
+    
+    salary_min = column("salary_min")
+    salary_max = column("salary_max")
+    has_min = salary_min.astype(bool)
+    has_max = salary_max.astype(bool)
+    
+    # 1. Calculate data age (once per distinct date)
+    date_str = _first_truthy(
+        column("posting_date"), column("opening_date"), column("closing_date"), column("enriched_at")
+    )
+    now = datetime.now(timezone.utc)
+    ages = _map_unique(date_str, lambda value: calculate_data_age(value, now=now))
+    age_months = np.array([age["data_age_months"] for age in ages], dtype=float)
+    has_age = ~np.isnan(age_months)
+    
+    # 2. Apply ECI aging to salaries (factor once per distinct age)
+    factor = np.array(_map_unique(age_months, _eci_factor), dtype=float)
+    min_values = pd.to_numeric(salary_min, errors="coerce").astype(float)
+    max_values = pd.to_numeric(salary_max, errors="coerce").astype(float)
+    
+    # apply_eci_aging falls back to 0% when salary_max is not a number
+    max_is_number = ~np.isnan(max_values) | pd.isna(salary_max)
+    
+    # 3. Normalize salary (use max or min)
+    salary_for_norm = pd.to_numeric(_first_truthy(salary_max, salary_min), errors="coerce").astype(float)
+    hours = np.array(_map_unique(column("hours_per_week"), parse_hours), dtype=float)
+    
+    salary_min_eci, salary_max_eci, eci_pct, hourly_rate, salary_40hr = _salary_kernel(
+        min_values, max_values, salary_for_norm, factor, hours,
+        has_min & has_age, has_max & has_age, max_is_number,
+    )
+    salary_min_eci = _round_like_python(salary_min_eci, 2)
+    salary_max_eci = _round_like_python(salary_max_eci, 2)
+    eci_pct = _round_like_python(eci_pct, 1)
+    hourly_rate = _round_like_python(hourly_rate, 2)
+    salary_40hr = _round_like_python(salary_40hr, 0)
+    
+    # 4. Calculate confidence
+    freshness = np.array([age["data_freshness"] for age in ages], dtype=object)
+    scores, issues = _confidence_arrays(
+        column("compensation_summary"),
+        column("census_match_confidence"),
+        freshness,
+        has_min | has_max,
+        column("employer_type_detected"),
+    )
+    
+    return pd.DataFrame({
+        "data_age_months": age_months,
+        "data_freshness": freshness,
+        "salary_min_eci_adjusted": salary_min_eci,
+        "salary_max_eci_adjusted": salary_max_eci,
+        "eci_adjustment_pct": eci_pct,
+        "effective_hourly_rate": hourly_rate,
+        "salary_40hr_equivalent": salary_40hr,
+        "data_confidence_score": scores,
+        "data_quality_issues": issues,
+    }, index=df.index)
+
+
+def confidence_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    calculate_confidence_score for every row of a DataFrame at once.
+    
+    Args:
+        df: Enriched job records (compensation_summary, census_match_confidence,
+            data_freshness, salary_min, salary_max, employer_type_detected)
+    
+    Returns:
+        DataFrame on the same index with data_confidence_score and data_quality_issues
+    """
+    scores, issues = _confidence_arrays(
+        _object_column(df, "compensation_summary"),
+        _object_column(df, "census_match_confidence"),
+        _object_column(df, "data_freshness"),
+        _object_column(df, "salary_min").astype(bool) | _object_column(df, "salary_max").astype(bool),
+        _object_column(df, "employer_type_detected"),
+    )
+    return pd.DataFrame({
+        "data_confidence_score": scores,
+        "data_quality_issues": issues,
+    }, index=df.index)
+
+
+def _confidence_arrays(
+    summary: np.ndarray,
+    census_raw: np.ndarray,
+    freshness: np.ndarray,
+    has_salary: np.ndarray,
+    emp_type: np.ndarray,
+) -> tuple:
+    """
+    Vectorized calculate_confidence_score: (scores, issue lists) for aligned columns.
+    
+    Penalties are summed as boolean arrays and recorded as _ISSUE_* bit flags;
+    each distinct (flags, census confidence) combination is turned into its
+    issue messages once.
+    """
+    # census_match_confidence as calculate_confidence_score reads it: falsy or
+    # unparseable -> 0; NaN stays NaN and so never counts as a low match
+    census = pd.to_numeric(census_raw, errors="coerce").astype(float)
+    census = np.where(np.isnan(census) & ~pd.isna(census_raw), 0.0, census)
+    census = np.where(census_raw.astype(bool), census, 0.0)
+    
+    no_summary = ~summary.astype(bool)
+    low_census = census < 75
+    stale = freshness == "Stale"
+    unknown_age = freshness == "Unknown"
+    no_salary = ~has_salary
+    unknown_employer = emp_type == "Unknown"
+    
+    scores = (
+        100
+        - 25 * no_summary
+        - 15 * low_census
+        - 15 * stale
+        - 10 * unknown_age
+        - 20 * no_salary
+        - 10 * unknown_employer
+    )
+    scores = np.maximum(scores, 0)
+    
+    flags = (
+        _ISSUE_NO_SUMMARY * no_summary
+        | _ISSUE_LOW_CENSUS * low_census
+        | _ISSUE_STALE * stale
+        | _ISSUE_UNKNOWN_AGE * unknown_age
+        | _ISSUE_NO_SALARY * no_salary
+        | _ISSUE_UNKNOWN_EMPLOYER * unknown_employer
+    ).astype(np.uint8)
+    
+    # The census figure only appears in the message for low matches
+    census_codes, census_values = pd.factorize(np.where(low_census, census, np.nan))
+    keys = (census_codes.astype(np.int64) + 1) * 64 + flags
+    codes, uniques = pd.factorize(keys)
+    messages = [
+        _issue_messages(key % 64, census_values[key // 64 - 1] if key >= 64 else None)
+        for key in uniques.tolist()
+    ]
+    issues = [list(messages[code]) for code in codes.tolist()]
+    return scores, issues
+
+
+def _issue_messages(flags: int, census_conf: float) -> tuple:
+    """data_quality_issues messages for a set of _ISSUE_* flags."""
+    messages = []
+    if flags & _ISSUE_NO_SUMMARY:
+        messages.append("No compensation summary")
+    if flags & _ISSUE_LOW_CENSUS:
+        messages.append(f"Low census match ({census_conf:.0f}%)")
+    if flags & _ISSUE_STALE:
+        messages.append("Stale data (>12 months)")
+    if flags & _ISSUE_UNKNOWN_AGE:
+        messages.append("Unknown data age")
+    if flags & _ISSUE_NO_SALARY:
+        messages.append("No salary data")
+    if flags & _ISSUE_UNKNOWN_EMPLOYER:
+        messages.append("Unknown employer type")
+    return tuple(messages)
+
+
 # Test
 if __name__ == "__main__":
     print("Statistical Processing Test")
@@ -310,9 +615,9 @@ if __name__ == "__main__":
         ("2024-01-01", None, None),  # ~2 years ago
         (None, None, "2026-01-01T00:00:00Z"),  # Fallback to enriched_at
     ]
-    for pd, cd, ea in test_dates:
-        result = calculate_data_age(pd, cd, ea)
-        print(f"  {pd or cd or ea}: {result['data_age_months']} months ({result['data_freshness']})")
+    for posted, cd, ea in test_dates:
+        result = calculate_data_age(posted, cd, ea)
+        print(f"  {posted or cd or ea}: {result['data_age_months']} months ({result['data_freshness']})")
     
     # Test ECI aging
     print("\n2. ECI Adjustment:")
@@ -335,3 +640,20 @@ if __name__ == "__main__":
     for salary, hours in test_norm:
         result = normalize_salary(salary, hours)
         print(f"  ${salary:,} at {hours}hrs/wk → ${result['salary_40hr_equivalent']:,.0f} (40hr equiv), ${result['effective_hourly_rate']:.2f}/hr")
+    
+    # Batch path must round exactly like the per-row functions (half-cent ties included)
+    print("\n4. Batch vs Per-Row:")
+    test_rows = [
+        {"salary_min": salary, "salary_max": salary, "hours_per_week": hours, "posting_date": "2025-06-01"}
+        for salary in (13572, 55926, 52000, 50000.5, 61234.25)
+        for hours in ("40", "20", "37.5")
+    ]
+    batch = process_statistical_enrichment_batch(pd.DataFrame(test_rows, dtype=object))
+    rounded_cols = ["salary_min_eci_adjusted", "salary_max_eci_adjusted", "eci_adjustment_pct",
+                    "effective_hourly_rate", "salary_40hr_equivalent"]
+    mismatches = 0
+    for i, row in enumerate(test_rows):
+        expected = process_statistical_enrichment(row)
+        mismatches += sum(batch[col].iloc[i] != expected[col] for col in rounded_cols)
+    print(f"  {len(test_rows)} rows, {mismatches} mismatched values")
+    assert mismatches == 0